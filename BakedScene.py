@@ -0,0 +1,105 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# =============================== Imports ======================================
+import numpy as np
+
+from Config import PERSON, OBJECT, PLACE
+from SceneSnapshot import Object, Person, Place, Camera, SceneSnapshot
+
+# =============================== Baked scene ==================================
+# The eyes of a person are stored as entities of their own with these suffixes.
+EYE_SUFFIXES = ["_eye.L", "_eye.R"]
+EYE = 3
+
+
+class BakedScene:
+    """
+    The world positions of all entities of a scene for every frame. positions has the
+    shape (frames, entities, 3) and starts at first_frame. Entity i is called names[i],
+    kinds[i] is PERSON, OBJECT, PLACE or EYE and heights[i] is the height of a person.
+    camera holds the aperture angle, the resolution and the configuration of the camera
+    at the first frame.
+    """
+
+    def __init__(self, names, kinds, heights, positions, first_frame, camera):
+        self.names = list(names)
+        self.kinds = np.asarray(kinds, dtype=np.int8)
+        self.heights = np.asarray(heights, dtype=np.float64)
+        self.positions = np.asarray(positions, dtype=np.float64)
+        self.first_frame = int(first_frame)
+        self.camera = np.asarray(camera, dtype=np.float64)
+        self.index = dict([(name, i) for i, name in enumerate(self.names)])
+
+    def getFrames(self):
+        return range(self.first_frame, self.first_frame + len(self.positions))
+
+    def getLastFrame(self):
+        return self.first_frame + len(self.positions) - 1
+
+    def getNames(self, kind):
+        return [name for name, k in zip(self.names, self.kinds) if k == kind]
+
+    def getLocation(self, name, frame):
+        return self.positions[frame - self.first_frame, self.index[name]]
+
+    def getInitialConfiguration(self):
+        return self.camera[3:8]
+
+    def createPerson(self, name, frame):
+        location = self.getLocation(name, frame)
+        eyes = []
+        for suffix in EYE_SUFFIXES:
+            if name + suffix in self.index:
+                eyes.append(self.getLocation(name + suffix, frame))
+            else:
+                eyes.append(location)
+        return Person(name, location, self.heights[self.index[name]], eyes[0], eyes[1])
+
+    def createSnapshot(self, frame, target, linetarget, shots, configuration,
+                       time_budget=None, warm_start=False):
+        """
+        Returns the SceneSnapshot at frame for a camera with the given configuration
+        (location, x-rotation and z-rotation).
+        """
+        camera = Camera(self.camera[0], int(self.camera[1]), int(self.camera[2]),
+            configuration[:3], (configuration[3], 0, configuration[4]))
+        persons = [self.createPerson(name, frame) for name in self.getNames(PERSON)]
+        objects = [Object(name, self.getLocation(name, frame)) for name in
+                   self.getNames(OBJECT)]
+        places = [Place(name, self.getLocation(name, frame)) for name in
+                  self.getNames(PLACE)]
+        entities = dict([(entity.name, entity) for entity in persons + objects + places])
+        return SceneSnapshot(entities[target], entities[linetarget], camera, persons, objects,
+            places, shots, time_budget, warm_start)
+
+    def save(self, filename):
+        np.savez_compressed(filename, names=np.array(self.names), kinds=self.kinds,
+            heights=self.heights, positions=self.positions,
+            first_frame=np.array(self.first_frame), camera=self.camera)
+
+
+def loadBakedScene(filename):
+    data = np.load(filename)
+    return BakedScene([str(name) for name in data["names"]], data["kinds"], data["heights"],
+        data["positions"], int(data["first_frame"]), data["camera"])
+
+
+def createTestBakedScene(frames=240, first_frame=1, camera_location=(1, -5, 1)):
+    """
+    Returns a BakedScene in which Max and Agnes walk side by side past a table. It is
+    used by the benchmarks and the tests.
+    """
+    t = np.arange(frames) / 24.0
+    max_path = np.column_stack((0.5 * t, 0 * t, 0 * t))
+    agnes_path = np.column_stack((2 + 0.5 * t, 0.3 * np.sin(t), 0 * t))
+    names = ["Max", "Max_eye.L", "Max_eye.R", "Agnes", "Agnes_eye.L", "Agnes_eye.R", "Table",
+             "Room"]
+    kinds = [PERSON, EYE, EYE, PERSON, EYE, EYE, OBJECT, PLACE]
+    heights = [1.8, 0, 0, 1.7, 0, 0, 0, 0]
+    positions = np.stack([max_path, max_path + [0.1, -0.05, 1.7], max_path + [0.1, 0.05, 1.7],
+                          agnes_path, agnes_path + [-0.1, -0.05, 1.6],
+                          agnes_path + [-0.1, 0.05, 1.6], np.tile([1, -1, 0.8], (frames, 1)),
+                          np.zeros((frames, 3))], axis=1)
+    camera = [0.48271098732948303, 1920, 1080] + list(camera_location) + [np.pi / 2, 0]
+    return BakedScene(names, kinds, heights, positions, first_frame, camera)
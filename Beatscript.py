@@ -1,6 +1,8 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+from bisect import bisect_right
+
 from Config import PERSON, OBJECT, PLACE, DEMONSTRAT_TYPE_NAMES, BEAT_TYPE_NAMES
 from Config import INTRODUCE, EXPRESS, SAYS, ACTION, SHOW
 from Config import DETAIL, CLOSEUP, MEDIUM_SHOT, AMERICAN_SHOT, FULL_SHOT
@@ -178,4 +180,36 @@ def getBeatsBetweenFrames(beatscript, start_frame, end_frame):
     beat_list = [beat for beat in beatscript if start_frame < beat.shotId <= end_frame]
     for beat in beat_list:
         beat.shot = DETAIL
-    return beat_list
\ No newline at end of file
+    return beat_list
+
+
+class FrameIndex:
+    """
+    Sorts the beats of a beatscript by their frame (the shotId) once, so the beats
+    between two frames are found with bisect instead of scanning the whole beatscript.
+    Beats with the same frame keep their order.
+    """
+
+    def __init__(self, beatscript):
+        self.beats = sorted(beatscript, key=lambda beat: beat.shotId)
+        self.frames = [beat.shotId for beat in self.beats]
+
+    def getBeatsBetweenFrames(self, start_frame, end_frame):
+        """
+        Same as getBeatsBetweenFrames for the indexed beatscript.
+        """
+        beat_list = self.beats[bisect_right(self.frames, start_frame):
+                               bisect_right(self.frames, end_frame)]
+        for beat in beat_list:
+            beat.shot = DETAIL
+        return beat_list
+
+    def getBlockStartFrames(self, after_frame=0):
+        """
+        Returns the sorted list of frames after after_frame where new beats start.
+        """
+        start_frames = []
+        for frame in self.frames[bisect_right(self.frames, after_frame):]:
+            if not start_frames or start_frames[-1] != frame:
+                start_frames.append(frame)
+        return start_frames
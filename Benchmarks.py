@@ -0,0 +1,269 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# =============================== Imports ======================================
+from multiprocessing import Process, Queue
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn import preprocessing
+
+from Classify import getDataMatrix, trainSVM, calculateDistribution
+from BakedScene import createTestBakedScene
+from CameramanCore import Cameraman, BakedSceneAdapter, ReplayClassifier
+from CameramanCore import PositionProcessOptimizer, getEntities
+from Config import TRAIN_FILES, CLOSEUP, MEDIUM_SHOT, FULL_SHOT
+from ShotPlan import PlanEntry, getEntryForFrame
+from TrajectorySolver import solveTrajectory
+from FitnessFunction import fitness
+from PositionProcess import CameraOptimizer, POWELL, LBFGSB
+from SceneSnapshot import SceneSnapshot, Camera, Person, Object
+
+# =============================== Helpers ======================================
+def measure(function, repetitions):
+    """
+    Returns the mean wall time of function() in seconds.
+    """
+    start = time.time()
+    for _ in range(repetitions):
+        function()
+    return (time.time() - start) / repetitions
+
+
+def printResult(name, seconds):
+    print("%-45s %12.3f ms" % (name, seconds * 1000.0))
+
+
+def createTestSnapshot(persons=3, objects=1, shots=range(0, 7)):
+    """
+    Returns a SceneSnapshot with a dialogue between Max and Agnes, some more persons
+    standing behind them and some objects (props) between them.
+    """
+    camera = Camera(0.48271098732948303, 1920, 1080, [5, 0, 1], [np.pi / 2, 0, np.pi / 2])
+    target = Person("Max", np.array([0, 0, 0]), 1.8, np.array([0.1, -0.05, 1.7]),
+        np.array([0.1, 0.05, 1.7]))
+    linetarget = Person("Agnes", np.array([2, 0, 0]), 1.7, np.array([1.9, -0.05, 1.6]),
+        np.array([1.9, 0.05, 1.6]))
+    personlist = [target, linetarget]
+    for i in range(persons - 2):
+        personlist.append(Person("Person" + str(i), np.array([1 + i, 2, 0]), 1.75,
+            np.array([1 + i, 1.9, 1.65]), np.array([1.1 + i, 1.9, 1.65])))
+    objectlist = [Object("Object" + str(i), np.array([1, -1 - i, 0.8])) for i in range(objects)]
+    return SceneSnapshot(target, linetarget, camera, personlist, objectlist, [], list(shots))
+
+
+def createTestPlan():
+    return [PlanEntry(1, MEDIUM_SHOT, "Max", "Agnes", True),
+            PlanEntry(60, MEDIUM_SHOT, "Agnes", "Max", False),
+            PlanEntry(100, CLOSEUP, "Agnes", "Max", True),
+            PlanEntry(170, FULL_SHOT, "Max", "Agnes", True)]
+
+# =============================== Benchmarks ===================================
+def distributionInChildProcess(classifier, datum):
+    """
+    This is how distributions were calculated before: one Process per query.
+    """
+    queue = Queue()
+    process = Process(target=calculateDistribution, args=(classifier, datum, queue))
+    process.start()
+    distribution = queue.get()
+    process.join()
+    return distribution
+
+
+def benchmarkPrediction(repetitions=50):
+    data, classes = getDataMatrix(TRAIN_FILES[:10], True)
+    scaler = preprocessing.Scaler()
+    data = scaler.fit_transform(data)
+    classifier = trainSVM(data, classes)
+    datum = data[:1]
+    printResult("Distribution in a new Process",
+        measure(lambda: distributionInChildProcess(classifier, datum), repetitions))
+    printResult("Distribution in-process",
+        measure(lambda: calculateDistribution(classifier, datum), repetitions))
+
+
+def benchmarkOptimizers(scenes=((2, 0), (3, 1), (4, 2))):
+    """
+    Optimizes all shots from all starting points with every optimization method and
+    prints the number of fitness evaluations, the wall time and the summed fitness of
+    the best configurations.
+    """
+    for persons, objects in scenes:
+        for method in [POWELL, LBFGSB]:
+            evaluations = 0
+            fitness_sum = 0
+            start = time.time()
+            for shot in range(0, 7):
+                optimizer = CameraOptimizer(createTestSnapshot(persons, objects, [shot]), shot,
+                    method)
+                results = []
+                for startvector in optimizer.getStartVectors():
+                    results.append(optimizer.optimizeFrom(startvector)[1])
+                    evaluations += optimizer.evaluations
+                fitness_sum += min(results)
+            seconds = time.time() - start
+            print("%d persons, %d objects, %-10s %8d evaluations %10.3f s  fitness %10.1f" % (
+                persons, objects, method, evaluations, seconds, fitness_sum))
+
+
+def benchmarkFitness(scenes=((2, 0), (5, 5), (10, 20), (20, 40)), repetitions=200):
+    """
+    Prints the wall time of one fitness evaluation for scenes with more and more persons
+    and props.
+    """
+    genome = np.array([3, -4, 0.5, np.pi / 2, 0.6])
+    for persons, objects in scenes:
+        optimizer = CameraOptimizer(createTestSnapshot(persons, objects, [2]), 2)
+        printResult("Fitness with %d persons and %d objects" % (persons, objects),
+            measure(lambda: fitness(genome, optimizer), repetitions))
+
+
+def benchmarkGlobalSearch(scenes=((2, 0), (3, 1), (4, 2))):
+    """
+    Optimizes all shots with LBFGSB with and without the global search and prints the
+    wall time and the summed fitness of the best configurations.
+    """
+    for persons, objects in scenes:
+        for global_search in [False, True]:
+            fitness_sum = 0
+            start = time.time()
+            for shot in range(0, 7):
+                optimizer = CameraOptimizer(createTestSnapshot(persons, objects, [shot]), shot,
+                    LBFGSB)
+                fitness_sum += min([optimizer.optimizeFrom(startvector)[1] for startvector in
+                                    optimizer.getStartVectors(global_search)])
+            seconds = time.time() - start
+            print("%d persons, %d objects, global search %-5s %10.3f s  fitness %10.1f" % (
+                persons, objects, global_search, seconds, fitness_sum))
+
+
+def benchmarkTrajectory(frames=240):
+    """
+    Solves the whole camera path of a scene with three cuts offline.
+    """
+    baked = createTestBakedScene(frames)
+    start = time.time()
+    solveTrajectory(baked, createTestPlan())
+    seconds = time.time() - start
+    printResult("Whole trajectory of %d frames" % frames, seconds)
+    printResult("Trajectory per frame", seconds / frames)
+
+
+class TimedOptimizer:
+    """
+    Measures the time the Cameraman waits for the PositionProcess.
+    """
+
+    def __init__(self):
+        self.optimizer = PositionProcessOptimizer()
+        self.seconds = 0.0
+
+    def __call__(self, scene_snapshot):
+        start = time.time()
+        results = self.optimizer(scene_snapshot)
+        self.seconds += time.time() - start
+        return results
+
+
+def runCameraman(baked, classifier, pipelined=True, adaptive=False):
+    """
+    Runs the frame loop of the Cameraman without its output. Returns the wall time,
+    the time spent waiting for the PositionProcess, the Cameraman and the keyframes.
+    """
+    optimizer = TimedOptimizer()
+    adapter = BakedSceneAdapter(baked)
+    cameraman = Cameraman(adapter, classifier, optimizer, pipelined=pipelined,
+        adaptive=adaptive)
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    start = time.time()
+    try:
+        cameraman.run()
+    finally:
+        seconds = time.time() - start
+        sys.stdout.close()
+        sys.stdout = stdout
+        optimizer.optimizer.close()
+    return seconds, optimizer.seconds, cameraman, adapter.keyframes
+
+
+def benchmarkCameraman(frames=240):
+    """
+    Runs the frame loop of the Cameraman for a whole scene without blender: the scene
+    is replayed from a BakedScene and the classifier replays a shot plan.
+    """
+    baked = createTestBakedScene(frames)
+    seconds, optimizer_seconds, _, _ = runCameraman(baked,
+        ReplayClassifier(getEntities(baked), createTestPlan()))
+    printResult("Cameraman for %d frames" % frames, seconds)
+    printResult("Cameraman per frame", seconds / frames)
+    printResult("Waiting for the PositionProcess per frame", optimizer_seconds / frames)
+
+
+def benchmarkPipeline(frames=240, delay=2.0):
+    """
+    Runs the Cameraman with a classifier which needs delay seconds per block, once
+    waiting for every classification and once classifying the next block while the
+    camera is positioned.
+    """
+    baked = createTestBakedScene(frames)
+    for pipelined in [False, True]:
+        seconds, optimizer_seconds, _, _ = runCameraman(baked,
+            ReplayClassifier(getEntities(baked), createTestPlan(), delay), pipelined)
+        printResult("Cameraman pipelined=%s" % pipelined, seconds)
+        printResult("Waiting for the PositionProcess", optimizer_seconds)
+
+
+def getMeanFitness(baked, plan, keyframes):
+    """
+    Returns the mean fitness of the keyframes for the shots of the plan.
+    """
+    values = []
+    for frame in keyframes.getFrames():
+        entry = getEntryForFrame(plan, frame)
+        configuration = keyframes[frame][0]
+        snapshot = baked.createSnapshot(frame, entry.target, entry.linetarget, [entry.shot],
+            configuration)
+        values.append(fitness(configuration, CameraOptimizer(snapshot, entry.shot)))
+    return np.mean(values)
+
+
+def benchmarkAdaptive(frames=240):
+    """
+    Runs the Cameraman with an optimization at every frame and with the optimum
+    interpolated between samples. Prints the wall time, the number of optimizations
+    and the mean fitness of the keyframes.
+    """
+    baked = createTestBakedScene(frames)
+    for adaptive in [False, True]:
+        seconds, _, cameraman, keyframes = runCameraman(baked,
+            ReplayClassifier(getEntities(baked), createTestPlan()), adaptive=adaptive)
+        print("adaptive %-5s %10.3f s  %4d optimizations  mean fitness %8.1f" % (adaptive,
+            seconds, cameraman.optimizerCalls, getMeanFitness(baked, cameraman.plan,
+                                                              keyframes)))
+
+
+BENCHMARKS = {"prediction": benchmarkPrediction,
+              "optimizers": benchmarkOptimizers,
+              "fitness": benchmarkFitness,
+              "globalsearch": benchmarkGlobalSearch,
+              "trajectory": benchmarkTrajectory,
+              "cameraman": benchmarkCameraman,
+              "pipeline": benchmarkPipeline,
+              "adaptive": benchmarkAdaptive}
+
+# =============================== Main =========================================
+def main():
+    if len(sys.argv) >= 2:
+        names = sys.argv[1:]
+    else:
+        names = sorted(BENCHMARKS)
+    for name in names:
+        print("###################### " + name + " ######################")
+        BENCHMARKS[name]()
+
+if __name__ == "__main__":
+    main()
@@ -1,292 +1,182 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
 
-from os import path
-from mathutils import Vector, Euler
 import bpy
-
-import subprocess
-import pickle
-
-from Config import PROJECT_PATH, SHOT_NAMES
-from SceneSnapshot import Object, Person, Place, Camera, SceneSnapshot
-
-POSITION_PROCESS_FILENAME = path.abspath(path.join(PROJECT_PATH, "PositionProcess.py"))
-CLASSIFICATION_PROCESS_FILENAME = path.abspath(
-    path.join(PROJECT_PATH, "ClassificationProcess.py"))
-
-# ============================= Communication ==============================================
-def getShotDistribution(classificationProcess):
-    classificationProcess.stdin.write(b'p\n')
-    return pickle.load(classificationProcess.stdout)
-
-def getTargets(classificationProcess):
-    classificationProcess.stdin.write(b't\n')
-    classificationProcess.stdin.flush()
-    targetstr = classificationProcess.stdout.readline().decode('utf-8').rstrip()
-    splitstr = targetstr.split('\t')
-    target = bpy.data.objects[splitstr[0]]
-    linetarget = bpy.data.objects[splitstr[1]]
-    return target, linetarget
-
-def shouldCut(classificationProcess):
-    classificationProcess.stdin.write(b'c\n')
-    classificationProcess.stdin.flush()
-    cut = classificationProcess.stdout.readline().decode('utf-8').rstrip() == "yes"
-    return cut
-
-def thereAreNewBeats(classificationProcess, frame):
-    classificationProcess.stdin.write(b'f\n' + (str(frame) + '\n').encode("utf-8"))
-    classificationProcess.stdin.flush()
-    return classificationProcess.stdout.readline().decode('utf-8').rstrip() == "yes"
+import numpy as np
+
+from BakedScene import BakedScene, EYE, EYE_SUFFIXES
+from CameramanCore import SceneAdapter, Cameraman, ClassifierProcess
+from CameramanCore import PositionProcessOptimizer, KeyframeBuffer, updateKeyframes
+from CameramanCore import CAMERA_OBJECT
+from Config import PERSON, OBJECT, PLACE
+from ShotPlan import savePlan
+
+# Seconds the PositionProcess may spend per frame. Set this for interactive previews;
+# None waits until the optimization of every shot converged.
+TIME_BUDGET = None
+# The shots, targets and cuts of a run are written to this file (relative to the
+# blendfile). TrajectorySolver.py can solve the whole camera path for such a plan.
+PLAN_FILENAME = "//automoculus_plan.csv"
+# The positions of all entities for every frame are baked into this file (relative to
+# the blendfile) before the camera is positioned.
+BAKE_FILENAME = "//automoculus_bake.npz"
 
 # ============================= Helpers ===================================================
-def createPersonObject(person):
-    try:
-        personEyeL = bpy.data.objects[person.name + "_eye.L"].location
-        personEyeR = bpy.data.objects[person.name + "_eye.R"].location
-    except KeyError:
-        personEyeL = person.location
-        personEyeR = person.location
-    return Person(person.name, person.location, person.dimensions.z, personEyeL, personEyeR)
+def bakeScene(entities, first_frame, last_frame):
+    """
+    Reads the world positions of all entities of the beatscript (and the eyes of the
+    persons) for every frame from first_frame to last_frame in one pass. The current
+    frame and the camera are restored afterwards.
+    """
+    scene = bpy.context.scene
+    names, kinds, heights, objects = [], [], [], []
+    for kind, key in [(PERSON, "Persons"), (OBJECT, "Objects"), (PLACE, "Places")]:
+        for name in [name for name in entities[key] if name]:
+            names.append(name)
+            kinds.append(kind)
+            heights.append(bpy.data.objects[name].dimensions.z)
+            objects.append(bpy.data.objects[name])
+            for eye_name in [name + suffix for suffix in EYE_SUFFIXES]:
+                if kind == PERSON and eye_name in bpy.data.objects:
+                    names.append(eye_name)
+                    kinds.append(EYE)
+                    heights.append(0.0)
+                    objects.append(bpy.data.objects[eye_name])
+    camera = scene.camera
+    camera_location = camera.location.copy()
+    camera_rotation = camera.rotation_euler.copy()
+    camera_data = [camera.data.angle, scene.render.resolution_x, scene.render.resolution_y]
+    camera_data += list(camera_location) + [camera_rotation[0], camera_rotation[2]]
+    current_frame = scene.frame_current
+    positions = np.zeros((last_frame - first_frame + 1, len(objects), 3), dtype=np.float32)
+    for i, frame in enumerate(range(first_frame, last_frame + 1)):
+        scene.frame_set(frame)
+        for j, o in enumerate(objects):
+            positions[i, j] = o.matrix_world.translation
+    scene.frame_set(current_frame)
+    camera.location = camera_location
+    camera.rotation_euler = camera_rotation
+    return BakedScene(names, kinds, heights, positions, first_frame, camera_data)
+
+
+def writeFCurve(owner, data_path, index, coordinates):
+    """
+    Writes the keyframes (frame, value, frame, value, ...) to the F-curve of
+    owner.data_path[index] in one go. The F-curve is updated in place: keyframes at
+    other frames are kept and replaced keyframes keep their interpolation and handle
+    types (their handles are moved with them). The group and the modifiers stay too.
+    """
+    if owner.animation_data is None:
+        owner.animation_data_create()
+    if owner.animation_data.action is None:
+        owner.animation_data.action = bpy.data.actions.new(owner.name + "Action")
+    fcurves = owner.animation_data.action.fcurves
+    fcurve = fcurves.find(data_path, index)
+    if fcurve is None:
+        fcurve = fcurves.new(data_path, index=index)
+    points = fcurve.keyframe_points
+    existing = np.zeros(2 * len(points), dtype=np.float32)
+    points.foreach_get("co", existing)
+    updated, new = updateKeyframes(existing, coordinates)
+    shift = updated[1::2] - existing[1::2]
+    for handle in ["handle_left", "handle_right"]:
+        handles = np.zeros(2 * len(points), dtype=np.float32)
+        points.foreach_get(handle, handles)
+        handles[1::2] += shift
+        points.foreach_set(handle, handles)
+    points.add(len(new) // 2)
+    points.foreach_set("co", np.hstack((updated, new)))
+    fcurve.update()
+
+
+def writeKeyframes(camera, keyframes):
+    """
+    Writes all keyframes of a KeyframeBuffer to the F-curves of the camera.
+    """
+    for owner, data_path, index, coordinates in keyframes.getChannels():
+        writeFCurve(camera if owner == CAMERA_OBJECT else camera.data, data_path, index,
+            coordinates)
+
+# ============================= Scene adapter ==============================================
+class BlenderSceneAdapter(SceneAdapter):
+    """
+    Connects the Cameraman (see CameramanCore.py) to the scene and the camera in blender.
+    """
+
+    def __init__(self):
+        self.scene = bpy.context.scene
+        self.camera = self.scene.camera
+        self.keyframes = KeyframeBuffer()
+
+    def getLastFrame(self):
+        return self.scene.frame_end
+
+    def getFps(self):
+        return self.scene.render.fps
+
+    def getCameraConfiguration(self):
+        rotation = self.camera.rotation_euler
+        return np.array(list(self.camera.location) + [rotation[0], rotation[2]])
+
+    def bake(self, entities):
+        # frame 0 is baked as well for the velocity of the target at frame 1
+        baked = bakeScene(entities, 0, self.getLastFrame())
+        baked.save(bpy.path.abspath(BAKE_FILENAME))
+        return baked
 
-def setCurrentFrame(frame_nr):
-    bpy.data.scenes['Scene'].frame_current = frame_nr
-    bpy.ops.object.paths_calculate()
+    def setConfiguration(self, frame, configuration, focus_distance):
+        # The keyframes are written all at once by finish
+        self.keyframes.add(frame, configuration, focus_distance)
 
-def createScenicContext(process):
-    context = {"persons": [], "objects": [], "places": []}
-    process.stdin.write(b'e\n')
-    process.stdin.flush()
-    entities = pickle.load(process.stdout)
-    context["persons"] = [bpy.data.objects[e.name] for e in entities["Persons"] if e.name]
-    context["objects"] = [bpy.data.objects[e.name] for e in entities["Objects"] if e.name]
-    context["places"] = [bpy.data.objects[e.name] for e in entities["Places"] if e.name]
-    return context
+    def finish(self):
+        writeKeyframes(self.camera, self.keyframes)
+        self.keyframes.clear()
+        self.scene.frame_set(self.scene.frame_current)
 
 # ============================= Main Class =================================================
 class AutomoculusCameraman(bpy.types.Operator):
     bl_idname = "marker.automoculus"
     bl_label = "Automoculus - position camera"
 
-    def setConfiguration(self, newConfiguration, target):
-        self.camera.location = newConfiguration[0]
-        self.camera.rotation_euler = newConfiguration[1]
-        self.camera.keyframe_insert(data_path="rotation_euler")
-        self.camera.keyframe_insert(data_path="location")
-
-        bpy.data.scenes['Scene'].camera.data.dof_distance = (
-        target.location - self.camera.location).length
-        self.camera.data.keyframe_insert(data_path="dof_distance")
-
-
-    def calculateForNewBeats(self, classificationProcess, shot, frame, last_cut,
-                             initial_cut, scenicContext):
-        # New Beats! That changes the situation: what's the distribution now?
-        dist = getShotDistribution(classificationProcess)
-        print(dist)
-
-        # For new beats we have to update the targets
-        target, linetarget = getTargets(classificationProcess)
-        print(target.name + "\t" + linetarget.name)
-
-        # Should we cut? Ask the classificationProcess
-        cut = shouldCut(classificationProcess)
-        print("Cut: " + str(cut))
-
-        # Determine which shot fits best, regarding the classified propability
-        best_ratio = 0
-        best_config = (self.camera.location, self.camera.rotation_euler)
-        best_shot_candidate = shot
-        no_cut_ratio = 0
-        no_cut_config = (self.camera.location, self.camera.rotation_euler)
-        correction = [100, 114, 81, 100, 109, 150, 200]
-        #correction = [100, 100, 100, 100, 100, 100, 100] # deactivate correction
-        shots = [s for s in range(len(SHOT_NAMES)) if dist[s] > 0.1 or s == shot]
-        print("Es kommen folgende Einstellungsgrößen in Frage: " + ", ".join(
-            [SHOT_NAMES[s] for s in shots]))
-        results = self.cameraOptimizer(scenicContext, target, linetarget, shots)
-        for result in results:
-            configuration, fitness, shot_number = result
-            print("Fitness %f for %s."%(fitness, SHOT_NAMES[shot_number]))
-            ratio = 1 / fitness * dist[shot_number] * correction[shot_number]
-            print("Ratio %f for %s."%(ratio, SHOT_NAMES[shot_number]))
-            if shot_number == shot:
-                no_cut_ratio = ratio
-                no_cut_config = configuration
-            if ratio > best_ratio:
-                best_ratio = ratio
-                best_config = configuration
-                best_shot_candidate = shot_number
-
-        # Should we Cut?
-        if best_ratio - 0.1 > no_cut_ratio or initial_cut or cut:
-            # We want to cut, the ratio gets much better
-            shot = best_shot_candidate
-            if (best_config[0] - self.camera.location).length < 1.8:
-                new_configuration = self.springConfigurator(best_config)
-                #new_configuration = best_config
-                print("Es sollte geschnitten werden, die Abweichung war jedoch zu gering." +
-                      "Wir bleiben bei " + SHOT_NAMES[shot])
-            else:
-                new_configuration = best_config
-                last_cut = frame
-                self.setInitialVelocity(target)
-                print("Schnitt auf: " + SHOT_NAMES[shot])
-        else: # We don't want to cut because the ratio doesn't get significantly better
-            new_configuration = self.springConfigurator(no_cut_config)
-            #new_configuration = no_cut_config
-            print("Kein Schnitt. Wir bleiben bei " + SHOT_NAMES[shot])
-
-        # Tell our decision to the classifier
-        classificationProcess.stdin.write(b'd\n')
-        classificationProcess.stdin.flush()
-        classificationProcess.stdin.write((str(shot) + "\n").encode('utf-8'))
-        classificationProcess.stdin.flush()
-        if classificationProcess.stdout.readline().decode(
-            'utf-8').rstrip() != "decision recieved":
-            print("Could not Write decision.")
-        return new_configuration, shot, last_cut, target, linetarget
-
-
-    def setInitialVelocity(self, target):
-        # Geschwindigkeit des Targets auf die Kamera übertragen.
-        current_frame = bpy.data.scenes['Scene'].frame_current
-        target_previous_position = Vector(target.location)
-        setCurrentFrame(current_frame - 1)
-        target_velocity = (target_previous_position - target.location) * 1.333333
-        setCurrentFrame(current_frame)
-        self.velocity = (target_velocity, Euler((0, 0, 0), 'XYZ'))
-
-
-    def createCameraObject(self):
-        aperture = bpy.data.scenes['Scene'].camera.data.angle
-        res_x = bpy.context.scene.render.resolution_x
-        res_y = bpy.context.scene.render.resolution_y
-        location = self.camera.location
-        rotation = self.camera.rotation_euler
-        return Camera(aperture, res_x, res_y, location, rotation)
-
-
-    def submitSceneSnapshot(self, optimizationProcess, context, target, linetarget, shots):
-        camera = self.createCameraObject()
-        persons = [createPersonObject(p) for p in context['persons']]
-        objects = [Object(o.name, o.location) for o in context['objects']]
-        places = [Place(p.name, p.location) for p in context['places']]
-        target_object = persons[context['persons'].index(target)]
-        if linetarget in context['persons'] :
-            linetarget_object = persons[context['persons'].index(linetarget)]
-        elif linetarget in context['objects'] :
-            linetarget_object = objects[context['objects'].index(linetarget)]
-        else : # in places
-            linetarget_object =places[context['places'].index(linetarget)]
-        snapshot = SceneSnapshot(target_object, linetarget_object, camera, persons, objects,
-            places, shots)
-        pickle.dump(snapshot, optimizationProcess.stdin, protocol=2)
-
-
-    def waitForOk(self, optimizationProcess):
-        returnstr = optimizationProcess.stdout.readline().decode('utf-8').rstrip()
-        while returnstr != "OK":
-            if len(returnstr) > 0:
-                print(returnstr)
-            returnstr = optimizationProcess.stdout.readline().decode('utf-8').rstrip()
-
-
-    def tupleToConfiguration(self, t):
-        location = Vector(t[:3])
-        rotation = Euler((t[3], 0, t[4]), "XYZ")
-        return location, rotation
-
-
-    def cameraOptimizer(self, context, target, linetarget, shots):
-        optimizationProcess = subprocess.Popen(
-            ['python', POSITION_PROCESS_FILENAME]
-            , stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-
-        self.submitSceneSnapshot(optimizationProcess, context, target, linetarget, shots)
-        self.waitForOk(optimizationProcess)
-
-        results = pickle.load(optimizationProcess.stdout)
-        result_list = [(self.tupleToConfiguration(r[0]), r[1], r[2]) for r in results]
-        return result_list
-
-
-    def springConfigurator(self, opt):
-        opt[1].make_compatible(self.camera.rotation_euler)
-        vloc = self.velocity[0]
-        vrot = self.velocity[1]
-        aloc = (opt[0] - self.camera.location) * 14
-        arot = Euler(((opt[1][0] - self.camera.rotation_euler[0]) * 9, 0,
-                      (opt[1][2] - self.camera.rotation_euler[2]) * 12), 'XYZ')
-        vloc += aloc * (1.0 / bpy.data.scenes['Scene'].render.fps)
-        vrot = Euler((vrot[0] + arot[0] * (1.0 / bpy.data.scenes['Scene'].render.fps), 0,
-                      vrot[2] + arot[2] * (1.0 / bpy.data.scenes['Scene'].render.fps)),
-            'XYZ')
-        loc = self.camera.location + vloc * (1.0 / bpy.data.scenes['Scene'].render.fps)
-        rot = Euler((self.camera.rotation_euler[0] + vrot[0] * (
-        1.0 / bpy.data.scenes['Scene'].render.fps), 0,
-                     self.camera.rotation_euler[2] + vrot[2] * (
-                     1.0 / bpy.data.scenes['Scene'].render.fps)), 'XYZ')
-        self.velocity = (vloc * 0.75, Euler((vrot[0] * 0.75, 0, vrot[2] * 0.75), 'XYZ'))
-        return loc, rot
-
+    def invoke(self, context, event):
+        # the processes are closed even if the Cameraman or savePlan raises
+        classifier = ClassifierProcess(beatscript)
+        try:
+            optimizer = PositionProcessOptimizer()
+            try:
+                cameraman = Cameraman(BlenderSceneAdapter(), classifier, optimizer,
+                    TIME_BUDGET)
+                plan = cameraman.run()
+            finally:
+                optimizer.close()
+            savePlan(bpy.path.abspath(PLAN_FILENAME), plan)
+        finally:
+            classifier.close()
+        return {"FINISHED"}
 
-    def startClassificationProcess(self):
-        process = subprocess.Popen(
-            [CLASSIFICATION_PROCESS_FILENAME, beatscript],
-            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        return process
 
+class AutomoculusTrajectoryImport(bpy.types.Operator):
+    """
+    Inserts the keyframes of a camera path which was solved by TrajectorySolver.py.
+    """
+    bl_idname = "marker.automoculus_import_trajectory"
+    bl_label = "Automoculus - import camera trajectory"
 
-    def waitForTrainingToFinish(self, classificationProcess):
-        while True:
-            input = classificationProcess.stdout.readline()
-            print(input.decode('utf8').rstrip())
-            if input.decode('utf8').rstrip() == "Training finished.":
-                return
+    filepath = bpy.props.StringProperty(subtype="FILE_PATH")
 
+    def execute(self, context):
+        data = np.load(self.filepath)
+        keyframes = KeyframeBuffer()
+        for frame, configuration, focus_distance in zip(data["frames"],
+            data["configurations"], data["focus_distances"]):
+            keyframes.add(frame, configuration, focus_distance)
+        writeKeyframes(bpy.data.scenes['Scene'].camera, keyframes)
+        context.scene.frame_set(context.scene.frame_current)
+        return {"FINISHED"}
 
     def invoke(self, context, event):
-        classificationProcess = self.startClassificationProcess()
-        self.camera = bpy.data.scenes['Scene'].camera
-        shot = 0
-        lastcut = 0
-        self.waitForTrainingToFinish(classificationProcess)
-        scenicContext = createScenicContext(classificationProcess)
-        target, linetarget = getTargets(classificationProcess)
-        setCurrentFrame(1)
-        self.setInitialVelocity(target)
-
-        newConfiguration, shot, lastcut, target, linetarget = self.calculateForNewBeats(
-            classificationProcess, shot, 1, lastcut, True, scenicContext)
-        self.setConfiguration(newConfiguration, target)
-        print("Szenenkontext erzeugt.")
-        for frame in range(2, bpy.context.scene.frame_end + 1):
-            setCurrentFrame(frame)
-            print("Bearbeite Frame No. " + str(frame))
-            if frame - lastcut >= 19: # It's been 19 frames or more since the last cut
-                if thereAreNewBeats(classificationProcess, frame):
-                    print("Neue Beats, neues Glück!")
-                    newConfiguration, shot, lastcut, target, linetarget =\
-                    self.calculateForNewBeats(classificationProcess, shot, frame, lastcut,
-                        False, scenicContext)
-                else: # There were no new beats
-                    print("Keine neuen Beats.")
-                    optimalConfiguration, fitness, _ =\
-                    self.cameraOptimizer(scenicContext, target, linetarget, [shot])[0]
-                    newConfiguration = self.springConfigurator(optimalConfiguration)
-                    #newConfiguration = optimalConfiguration #uncomment to remove smoothing
-            else: # It's too early to cut
-                optimalConfiguration, fitness, _ = self.cameraOptimizer(scenicContext, target, linetarget, [shot])[0]
-                newConfiguration = self.springConfigurator(optimalConfiguration)
-                #newConfiguration = optimalConfiguration #uncomment to remove smoothing
-            self.setConfiguration(newConfiguration, target)
-
-        classificationProcess.stdin.write(b'q\n')
-        classificationProcess.stdin.flush()
-        print("Classification Process: " + classificationProcess.stdout.readline().decode('utf-8').rstrip())
-        classificationProcess.wait()
-        return {"FINISHED"}
+        context.window_manager.fileselect_add(self)
+        return {"RUNNING_MODAL"}
 
 bpy.utils.register_class(AutomoculusCameraman)
+bpy.utils.register_class(AutomoculusTrajectoryImport)
@@ -0,0 +1,696 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# =============================== Imports ======================================
+from os import path
+from bisect import bisect_right
+import subprocess
+import time
+
+import numpy as np
+
+from Config import PROJECT_PATH, SHOT_NAMES, PERSON, OBJECT, PLACE
+from Protocol import ENTITIES, BLOCK, ADVANCE, SCHEDULE, DECISION, QUIT, request
+from Protocol import readMessage, writeMessage
+from ShotPlan import PlanEntry, getEntryForFrame
+
+# =============================== Constants ====================================
+POSITION_PROCESS_FILENAME = path.abspath(path.join(PROJECT_PATH, "PositionProcess.py"))
+CLASSIFICATION_PROCESS_FILENAME = path.abspath(
+    path.join(PROJECT_PATH, "ClassificationProcess.py"))
+FIRST_FRAME = 1
+# The classifier is not asked for new beats before a shot lasted MIN_SHOT_LENGTH frames.
+MIN_SHOT_LENGTH = 19
+# Only shots with at least this probability are optimized (and the current shot).
+SHOT_THRESHOLD = 0.1
+# The probabilities of the shots are multiplied by these percentages.
+SHOT_CORRECTION = [100, 114, 81, 100, 109, 150, 200]
+#SHOT_CORRECTION = [100, 100, 100, 100, 100, 100, 100] # deactivate correction
+# The ratio of another shot has to be better by CUT_MARGIN to cut to it.
+CUT_MARGIN = 0.1
+# If the camera would move less than CUT_DISTANCE it moves there instead of cutting.
+CUT_DISTANCE = 1.8
+# The camera follows the optimum like a damped spring. One stiffness per dimension of
+# the configuration (x, y, z, x-rotation, z-rotation).
+SPRING_STIFFNESS = np.array([14, 14, 14, 9, 12])
+SPRING_DAMPING = 0.75
+# After a cut the camera starts with this multiple of the velocity of the target.
+INITIAL_VELOCITY_FACTOR = 1.333333
+# The keyframes of the camera object and of its camera data (see KeyframeBuffer).
+CAMERA_OBJECT, CAMERA_DATA = "object", "data"
+# Send the decision and the request for the next block to the classifier right after
+# the decision so it classifies while the camera is positioned for the frames in between.
+PIPELINE_CLASSIFIER = True
+# In the adaptive mode the optimum is only calculated at some frames between the block
+# boundaries and interpolated for the frames in between. The samples are at most
+# MAX_SAMPLE_STEP frames apart and a new sample starts when the target or the linetarget
+# moved more than SAMPLE_MOVEMENT. The intervals are halved until the optimum in the
+# middle (solved from the sample before it, not from the interpolation) deviates less
+# than LOCATION_TOLERANCE and ROTATION_TOLERANCE from the interpolation. The optimum of
+# the chosen shot at a block boundary is the first sample of the block.
+ADAPTIVE_KEYFRAMES = False
+MAX_SAMPLE_STEP = 96
+SAMPLE_MOVEMENT = 1.5
+LOCATION_TOLERANCE = 0.15
+ROTATION_TOLERANCE = 0.05
+
+# ============================= Keyframes ======================================
+class KeyframeBuffer:
+    """
+    Collects the keyframes of the camera so they can be written to its F-curves all at
+    once. A later keyframe at the same frame replaces the earlier one.
+    """
+
+    def __init__(self):
+        self.keyframes = {}
+
+    def __len__(self):
+        return len(self.keyframes)
+
+    def __getitem__(self, frame):
+        return self.keyframes[frame]
+
+    def getFrames(self):
+        return sorted(self.keyframes)
+
+    def add(self, frame, configuration, focus_distance):
+        self.keyframes[int(frame)] = (np.array(configuration, dtype=np.float64),
+                                      float(focus_distance))
+
+    def clear(self):
+        self.keyframes = {}
+
+    def getChannels(self):
+        """
+        Returns a list of (owner, data_path, index, coordinates) for every F-curve. owner
+        is CAMERA_OBJECT or CAMERA_DATA and coordinates is a float32 array with the frame
+        and the value of every keyframe (frame, value, frame, value, ...) sorted by frame.
+        """
+        frames = self.getFrames()
+        configurations = np.array([self.keyframes[frame][0] for frame in frames])
+        focus_distances = np.array([self.keyframes[frame][1] for frame in frames])
+        values = [(CAMERA_OBJECT, "location", 0, configurations[:, 0]),
+                  (CAMERA_OBJECT, "location", 1, configurations[:, 1]),
+                  (CAMERA_OBJECT, "location", 2, configurations[:, 2]),
+                  (CAMERA_OBJECT, "rotation_euler", 0, configurations[:, 3]),
+                  (CAMERA_OBJECT, "rotation_euler", 1, np.zeros(len(frames))),
+                  (CAMERA_OBJECT, "rotation_euler", 2, configurations[:, 4]),
+                  (CAMERA_DATA, "dof_distance", 0, focus_distances)]
+        channels = []
+        for owner, data_path, index, channel in values:
+            coordinates = np.empty(2 * len(frames), dtype=np.float32)
+            coordinates[0::2] = frames
+            coordinates[1::2] = channel
+            channels.append((owner, data_path, index, coordinates))
+        return channels
+
+
+def updateKeyframes(existing, coordinates):
+    """
+    Merges the keyframes of coordinates (frame, value, frame, value, ...) into the
+    existing keyframes without reordering them. Returns the existing keyframes with the
+    values at the frames of coordinates replaced and the keyframes at new frames.
+    """
+    existing = np.array(existing, dtype=np.float32).reshape((-1, 2))
+    coordinates = np.asarray(coordinates, dtype=np.float32).reshape((-1, 2))
+    indices = dict([(frame, i) for i, frame in enumerate(existing[:, 0])])
+    replaced = np.array([frame in indices for frame in coordinates[:, 0]], dtype=bool)
+    existing[[indices[frame] for frame in coordinates[replaced, 0]], 1] = \
+        coordinates[replaced, 1]
+    return existing.ravel(), coordinates[~replaced].ravel()
+
+# ============================= Scene adapters =================================
+class SceneAdapter:
+    """
+    Everything the Cameraman needs from the 3D application. A configuration is a
+    numpy array with the location, the x-rotation and the z-rotation of the camera.
+    """
+
+    def getLastFrame(self):
+        raise NotImplementedError()
+
+    def getFps(self):
+        raise NotImplementedError()
+
+    def getCameraConfiguration(self):
+        """
+        Returns the configuration of the camera before it is positioned.
+        """
+        raise NotImplementedError()
+
+    def bake(self, entities):
+        """
+        Returns a BakedScene with all entities (see Protocol.ENTITIES) from frame 0 to
+        the last frame.
+        """
+        raise NotImplementedError()
+
+    def setConfiguration(self, frame, configuration, focus_distance):
+        """
+        Keyframes the camera at frame.
+        """
+        raise NotImplementedError()
+
+    def finish(self):
+        """
+        Is called after the last frame was keyframed.
+        """
+        pass
+
+
+class BakedSceneAdapter(SceneAdapter):
+    """
+    Replays a BakedScene (e.g. automoculus_bake.npz of a run in blender) without
+    blender. The keyframes are collected in the KeyframeBuffer self.keyframes.
+    """
+
+    def __init__(self, baked, fps=24):
+        self.baked = baked
+        self.fps = fps
+        self.keyframes = KeyframeBuffer()
+
+    def getLastFrame(self):
+        return self.baked.getLastFrame()
+
+    def getFps(self):
+        return self.fps
+
+    def getCameraConfiguration(self):
+        return np.array(self.baked.getInitialConfiguration())
+
+    def bake(self, entities):
+        return self.baked
+
+    def setConfiguration(self, frame, configuration, focus_distance):
+        self.keyframes.add(frame, configuration, focus_distance)
+
+# ============================= Processes ======================================
+class ClassifierProcess:
+    """
+    The ClassificationProcess for a beatscript. request sends all commands in a
+    single message and returns the list of their results. Its stderr is not mixed into
+    the messages but goes to the console of this process.
+    """
+
+    def __init__(self, beatscript):
+        self.process = subprocess.Popen([CLASSIFICATION_PROCESS_FILENAME, beatscript],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.waitForTrainingToFinish()
+
+    def waitForTrainingToFinish(self):
+        while True:
+            line = self.process.stdout.readline().decode('utf8').rstrip()
+            print(line)
+            if line == "Training finished.":
+                return
+
+    def request(self, *commands):
+        return request(self.process.stdout, self.process.stdin, list(commands))
+
+    def send(self, *commands):
+        """
+        Sends the commands without waiting for the results. They have to be read with
+        receive before the next request.
+        """
+        writeMessage(self.process.stdin, list(commands))
+
+    def receive(self):
+        return readMessage(self.process.stdout)
+
+    def close(self):
+        if self.process.poll() is None:
+            self.request((QUIT,))
+        print("Classification Process: exiting...")
+        self.process.wait()
+
+
+class ReplayClassifier:
+    """
+    Answers the requests of the Cameraman like the ClassificationProcess but replays
+    the shots, targets and cuts of a shot plan (see ShotPlan.py). Every entry of the
+    plan is a block. Classifying a block takes delay seconds; like in a process of its
+    own this time runs in parallel between send and receive.
+    """
+
+    def __init__(self, entities, plan, delay=0.0):
+        self.entities = entities
+        self.plan = plan
+        self.delay = delay
+        self.current_frame = plan[0].frame
+        self.sent = None
+
+    def getBlockInformation(self, entry):
+        distribution = [0.0] * len(SHOT_NAMES)
+        distribution[entry.shot] = 1.0
+        return {"distribution": distribution, "targets": (entry.target, entry.linetarget),
+                "cut": entry.cut}
+
+    def advance(self, new_frame):
+        entries = [e for e in self.plan if self.current_frame < e.frame <= new_frame]
+        self.current_frame = new_frame
+        if not entries:
+            return {"new_beats": False}
+        result = {"new_beats": True}
+        result.update(self.getBlockInformation(entries[-1]))
+        return result
+
+    def execute(self, command):
+        name, arguments = command[0], command[1:]
+        if name == ENTITIES:
+            return self.entities
+        elif name == BLOCK:
+            return self.getBlockInformation(getEntryForFrame(self.plan, self.current_frame))
+        elif name == ADVANCE:
+            return self.advance(int(arguments[0]))
+        elif name == SCHEDULE:
+            return [entry.frame for entry in self.plan[1:]]
+        elif name in [DECISION, QUIT]:
+            return True
+        else:
+            raise ValueError("Unknown command: " + str(name))
+
+    def request(self, *commands):
+        self.send(*commands)
+        return self.receive()
+
+    def send(self, *commands):
+        results = [self.execute(command) for command in commands]
+        blocks = [command for command, result in zip(commands, results) if
+                  command[0] == ADVANCE and result["new_beats"]]
+        self.sent = (time.time() + self.delay * len(blocks), results)
+
+    def receive(self):
+        ready, results = self.sent
+        self.sent = None
+        time.sleep(max(0.0, ready - time.time()))
+        return results
+
+    def close(self):
+        pass
+
+
+class PositionProcessOptimizer:
+    """
+    Sends SceneSnapshots to the PositionProcess and returns the list of
+    (configuration, fitness, shot, converged). The PositionProcess stays alive for
+    the whole scene. If it dies (before or during a request) it is restarted and the
+    snapshot is sent once more. If it dies again an EOFError is raised. Its stderr goes
+    to the console of this process.
+    """
+
+    def __init__(self):
+        self.process = self.startPositionProcess()
+
+    def startPositionProcess(self):
+        return subprocess.Popen(['python', POSITION_PROCESS_FILENAME],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def waitForOk(self):
+        """
+        Prints the output of the PositionProcess until it writes "OK". Raises an
+        EOFError if the process exits before.
+        """
+        while True:
+            line = self.process.stdout.readline()
+            if not line:
+                raise EOFError("The PositionProcess exited during the optimization.")
+            returnstr = line.decode('utf-8').rstrip()
+            if returnstr == "OK":
+                return
+            if len(returnstr) > 0:
+                print(returnstr)
+
+    def __call__(self, scene_snapshot):
+        for attempt in range(2):
+            if self.process.poll() is not None:
+                self.process = self.startPositionProcess()
+            try:
+                writeMessage(self.process.stdin, scene_snapshot)
+                self.waitForOk()
+                results = readMessage(self.process.stdout)
+                break
+            except (EOFError, IOError):
+                self.process.wait()
+                if attempt > 0:
+                    raise EOFError("The PositionProcess died twice on the same snapshot.")
+        return [(np.array(r[0]), r[1], r[2], r[3]) for r in results]
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+# ============================= Helpers ========================================
+def getEntities(baked):
+    """
+    Returns the entities of a BakedScene like the ClassificationProcess does.
+    """
+    return {"Persons": baked.getNames(PERSON), "Objects": baked.getNames(OBJECT),
+            "Places": baked.getNames(PLACE)}
+
+
+def makeCompatible(configuration, reference):
+    """
+    Adds multiples of 2*pi to the rotations of configuration so they differ by at
+    most pi from the rotations of reference (like Euler.make_compatible).
+    """
+    configuration = np.array(configuration, dtype=np.float64)
+    difference = configuration[3:] - reference[3:]
+    configuration[3:] -= 2 * np.pi * np.round(difference / (2 * np.pi))
+    return configuration
+
+def interpolateConfigurations(frames, configurations, query_frames):
+    """
+    Interpolates the configurations at the sorted frames for query_frames with a cubic
+    Hermite spline (with the tangents of a Catmull-Rom spline).
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    configurations = np.asarray(configurations, dtype=np.float64)
+    query_frames = np.asarray(query_frames, dtype=np.float64)
+    if len(frames) == 1:
+        return np.tile(configurations[0], (len(query_frames), 1))
+    tangents = np.empty(configurations.shape)
+    tangents[0] = (configurations[1] - configurations[0]) / (frames[1] - frames[0])
+    tangents[-1] = (configurations[-1] - configurations[-2]) / (frames[-1] - frames[-2])
+    tangents[1:-1] = ((configurations[2:] - configurations[:-2]) /
+                      (frames[2:] - frames[:-2])[:, np.newaxis])
+    i = np.clip(np.searchsorted(frames, query_frames, side="right") - 1, 0, len(frames) - 2)
+    h = (frames[i + 1] - frames[i])[:, np.newaxis]
+    t = ((query_frames - frames[i]) / (frames[i + 1] - frames[i]))[:, np.newaxis]
+    return ((2 * t ** 3 - 3 * t ** 2 + 1) * configurations[i] +
+            (t ** 3 - 2 * t ** 2 + t) * h * tangents[i] +
+            (-2 * t ** 3 + 3 * t ** 2) * configurations[i + 1] +
+            (t ** 3 - t ** 2) * h * tangents[i + 1])
+
+
+def isClose(configuration, reference):
+    return (np.linalg.norm(configuration[:3] - reference[:3]) < LOCATION_TOLERANCE and
+            np.abs(makeCompatible(configuration, reference)[3:] - reference[3:]).max() <
+            ROTATION_TOLERANCE)
+
+# ============================= Cameraman ======================================
+class Cameraman:
+    """
+    Positions the camera for every frame of a scene. The shots, targets and cuts come
+    from the classifier (see ClassifierProcess), the optimal configurations from the
+    optimizer (see PositionProcessOptimizer) and the scene from the adapter (see
+    SceneAdapter). The decisions are collected in self.plan.
+    """
+
+    def __init__(self, adapter, classifier, optimizer, time_budget=None,
+                 pipelined=PIPELINE_CLASSIFIER, adaptive=ADAPTIVE_KEYFRAMES):
+        self.adapter = adapter
+        self.classifier = classifier
+        self.optimizer = optimizer
+        self.time_budget = time_budget
+        self.pipelined = pipelined
+        self.adaptive = adaptive
+        self.plan = []
+        self.pendingCommands = []
+        self.classifierFrame = 0
+        self.prefetchedFrame = None
+        self.optimizerCalls = 0
+        self.optima = {}
+        self.lastSample = None
+
+    def setConfiguration(self, newConfiguration, target, frame):
+        self.configuration = newConfiguration
+        focus_distance = np.linalg.norm(self.baked.getLocation(target, frame) -
+                                        newConfiguration[:3])
+        self.adapter.setConfiguration(frame, newConfiguration, focus_distance)
+
+
+    def calculateForNewBeats(self, blockInformation, shot, frame, last_cut, initial_cut):
+        # New Beats! That changes the situation: what's the distribution now?
+        dist = blockInformation["distribution"]
+        print(dist)
+
+        # For new beats we have to update the targets
+        target, linetarget = blockInformation["targets"]
+        print(target + "\t" + linetarget)
+
+        # Should we cut? The classificationProcess already told us.
+        cut = blockInformation["cut"]
+        print("Cut: " + str(cut))
+
+        # Determine which shot fits best, regarding the classified propability
+        best_ratio = 0
+        best_config = self.configuration
+        best_shot_candidate = shot
+        no_cut_ratio = 0
+        no_cut_config = self.configuration
+        shots = [s for s in range(len(SHOT_NAMES)) if dist[s] > SHOT_THRESHOLD or s == shot]
+        print("Es kommen folgende Einstellungsgrößen in Frage: " + ", ".join(
+            [SHOT_NAMES[s] for s in shots]))
+        results = self.cameraOptimizer(frame, target, linetarget, shots)
+        optima = {}
+        for result in results:
+            configuration, fitness, shot_number, converged = result
+            optima[shot_number] = configuration
+            print("Fitness %f for %s."%(fitness, SHOT_NAMES[shot_number]))
+            if not converged:
+                print("Die Optimierung für %s wurde abgebrochen." % SHOT_NAMES[shot_number])
+            ratio = 1 / fitness * dist[shot_number] * SHOT_CORRECTION[shot_number]
+            print("Ratio %f for %s."%(ratio, SHOT_NAMES[shot_number]))
+            if shot_number == shot:
+                no_cut_ratio = ratio
+                no_cut_config = configuration
+            if ratio > best_ratio:
+                best_ratio = ratio
+                best_config = configuration
+                best_shot_candidate = shot_number
+
+        # Should we Cut?
+        if best_ratio - CUT_MARGIN > no_cut_ratio or initial_cut or cut:
+            # We want to cut, the ratio gets much better
+            shot = best_shot_candidate
+            if np.linalg.norm(best_config[:3] - self.configuration[:3]) < CUT_DISTANCE:
+                new_configuration = self.springConfigurator(best_config)
+                #new_configuration = best_config
+                print("Es sollte geschnitten werden, die Abweichung war jedoch zu gering." +
+                      "Wir bleiben bei " + SHOT_NAMES[shot])
+            else:
+                new_configuration = best_config
+                last_cut = frame
+                self.setInitialVelocity(target, frame)
+                print("Schnitt auf: " + SHOT_NAMES[shot])
+        else: # We don't want to cut because the ratio doesn't get significantly better
+            new_configuration = self.springConfigurator(no_cut_config)
+            #new_configuration = no_cut_config
+            print("Kein Schnitt. Wir bleiben bei " + SHOT_NAMES[shot])
+
+        if self.adaptive and shot in optima:
+            # the optimum of the shot at this frame is the first sample of the block
+            self.lastSample = ((frame, target, linetarget, shot),
+                               makeCompatible(optima[shot], self.configuration))
+
+        # Tell our decision to the classifier with the next request
+        self.pendingCommands.append((DECISION, shot))
+        self.plan.append(PlanEntry(frame, shot, target, linetarget, last_cut == frame))
+        return new_configuration, shot, last_cut, target, linetarget
+
+
+    def advanceClassifier(self, frame):
+        """
+        Sends the pending commands and asks the classifier for new beats at frame in one
+        round trip. If there are new beats the result also contains the distribution,
+        the targets and the cut decision.
+        """
+        commands = self.pendingCommands + [(ADVANCE, frame)]
+        self.pendingCommands = []
+        self.classifierFrame = frame
+        return self.classifier.request(*commands)[-1]
+
+
+    def prefetchClassifier(self, last_cut):
+        """
+        Sends the pending commands and the request for new beats at the frame where
+        advanceClassifier would be called next without waiting for the result. This is
+        the first block start after the last request, but not before the shot lasted
+        MIN_SHOT_LENGTH frames.
+        """
+        frame = self.getNextClassifierFrame(last_cut)
+        if frame is None:
+            return
+        commands = self.pendingCommands + [(ADVANCE, frame)]
+        self.pendingCommands = []
+        self.classifierFrame = frame
+        self.prefetchedFrame = frame
+        self.classifier.send(*commands)
+
+
+    def getNextClassifierFrame(self, last_cut):
+        """
+        Returns the next frame where the classifier is asked for new beats or None if
+        this does not happen before the end of the scene.
+        """
+        if self.prefetchedFrame is not None:
+            return self.prefetchedFrame
+        i = bisect_right(self.blockStartFrames, self.classifierFrame)
+        if i >= len(self.blockStartFrames):
+            return None
+        frame = max(self.blockStartFrames[i], last_cut + MIN_SHOT_LENGTH)
+        if frame > self.adapter.getLastFrame():
+            return None
+        return frame
+
+
+    def getBlockInformation(self, frame, last_cut):
+        if self.pipelined:
+            if frame != self.prefetchedFrame:
+                return {"new_beats": False}
+            self.prefetchedFrame = None
+            return self.classifier.receive()[-1]
+        # Only talk to the classifier at block boundaries
+        if frame - last_cut >= MIN_SHOT_LENGTH and self.thereAreNewBeats(frame):
+            return self.advanceClassifier(frame)
+        return {"new_beats": False}
+
+
+    def thereAreNewBeats(self, frame):
+        """
+        Uses the block schedule of the classifier to check if new beats started since
+        the classifier was advanced the last time.
+        """
+        i = bisect_right(self.blockStartFrames, self.classifierFrame)
+        return i < len(self.blockStartFrames) and self.blockStartFrames[i] <= frame
+
+
+    def setInitialVelocity(self, target, frame):
+        # Geschwindigkeit des Targets auf die Kamera übertragen.
+        previous_frame = max(frame - 1, self.baked.first_frame)
+        self.velocity = np.zeros(5)
+        self.velocity[:3] = (self.baked.getLocation(target, frame) -
+                             self.baked.getLocation(target, previous_frame)
+                            ) * INITIAL_VELOCITY_FACTOR
+
+
+    def cameraOptimizer(self, frame, target, linetarget, shots, configuration=None,
+                        warm_start=False):
+        if configuration is None:
+            configuration = self.configuration
+        snapshot = self.baked.createSnapshot(frame, target, linetarget, shots,
+            configuration, self.time_budget, warm_start)
+        self.optimizerCalls += 1
+        return self.optimizer(snapshot)
+
+
+    def getOptimum(self, frame, target, linetarget, shot, last_cut):
+        """
+        Returns the optimal configuration for shot at frame. In the adaptive mode it is
+        interpolated between samples (see sampleOptima).
+        """
+        if not self.adaptive:
+            return self.cameraOptimizer(frame, target, linetarget, [shot])[0][0]
+        if frame not in self.optima:
+            self.sampleOptima(frame, target, linetarget, shot, last_cut)
+        return self.optima.pop(frame)
+
+
+    def getSampleEnd(self, frame, target, linetarget, last_cut):
+        """
+        Returns the last frame which can be interpolated from frame: before the next
+        request to the classifier, at most MAX_SAMPLE_STEP frames later and before the
+        target or the linetarget moved more than SAMPLE_MOVEMENT.
+        """
+        last = min(frame + MAX_SAMPLE_STEP, self.adapter.getLastFrame())
+        next_classifier_frame = self.getNextClassifierFrame(last_cut)
+        if next_classifier_frame is not None:
+            last = min(last, next_classifier_frame - 1)
+        for name in [target, linetarget]:
+            path = np.array([self.baked.getLocation(name, f) for f in range(frame, last + 1)])
+            moved = np.nonzero(np.linalg.norm(path - path[0], axis=1) > SAMPLE_MOVEMENT)[0]
+            if len(moved):
+                last = min(last, frame + max(1, moved[0]))
+        return max(last, frame)
+
+
+    def sampleOptima(self, frame, target, linetarget, shot, last_cut):
+        """
+        Calculates the optimum at frame (or reuses the last sample if it was the frame
+        before) and at the end of the interval (see getSampleEnd). The intervals are
+        halved until the optimum in the middle is close to the interpolation. The
+        interpolated optima are stored in self.optima.
+        """
+        last = self.getSampleEnd(frame, target, linetarget, last_cut)
+        # The samples only start from a nearby configuration so they follow one optimum
+        solve = lambda f, start: makeCompatible(self.cameraOptimizer(f, target, linetarget,
+            [shot], start, True)[0][0], start)
+        key = (frame - 1, target, linetarget, shot)
+        if self.lastSample is not None and self.lastSample[0] == key:
+            samples = {frame - 1: self.lastSample[1]}
+            first = frame - 1
+        else:
+            samples = {frame: solve(frame, self.configuration)}
+            first = frame
+        if last > first:
+            samples[last] = solve(last, samples[first])
+            intervals = [(first, last)]
+            while intervals:
+                a, b = intervals.pop()
+                if b - a < 2:
+                    continue
+                m = (a + b) // 2
+                interpolated = interpolateConfigurations([a, b], [samples[a], samples[b]],
+                    [m])[0]
+                # solved independently of the interpolation (from the sample before), a
+                # warm start from the interpolation would mostly stay there
+                samples[m] = solve(m, samples[a])
+                if not isClose(samples[m], interpolated):
+                    intervals += [(a, m), (m, b)]
+        sample_frames = sorted(samples)
+        configurations = interpolateConfigurations(sample_frames,
+            [samples[f] for f in sample_frames], range(frame, last + 1))
+        for f, configuration in zip(range(frame, last + 1), configurations):
+            self.optima[f] = configuration
+        self.lastSample = ((last, target, linetarget, shot), samples[last])
+
+
+    def springConfigurator(self, optimum):
+        optimum = makeCompatible(optimum, self.configuration)
+        dt = 1.0 / self.adapter.getFps()
+        acceleration = (optimum - self.configuration) * SPRING_STIFFNESS
+        velocity = self.velocity + acceleration * dt
+        configuration = self.configuration + velocity * dt
+        self.velocity = velocity * SPRING_DAMPING
+        return configuration
+
+
+    def run(self):
+        """
+        Positions the camera from FIRST_FRAME to the last frame of the scene and
+        returns the plan.
+        """
+        entities, blockInformation, self.blockStartFrames = self.classifier.request(
+            (ENTITIES,), (BLOCK,), (SCHEDULE,))
+        self.baked = self.adapter.bake(entities)
+        self.configuration = self.adapter.getCameraConfiguration()
+        shot = 0
+        lastcut = 0
+        target, linetarget = blockInformation["targets"]
+        self.setInitialVelocity(target, FIRST_FRAME)
+
+        newConfiguration, shot, lastcut, target, linetarget = self.calculateForNewBeats(
+            blockInformation, shot, FIRST_FRAME, lastcut, True)
+        self.setConfiguration(newConfiguration, target, FIRST_FRAME)
+        if self.pipelined:
+            self.prefetchClassifier(lastcut)
+        print("Szene gebacken.")
+        for frame in range(FIRST_FRAME + 1, self.adapter.getLastFrame() + 1):
+            print("Bearbeite Frame No. " + str(frame))
+            prefetched = frame == self.prefetchedFrame
+            blockInformation = self.getBlockInformation(frame, lastcut)
+            if blockInformation["new_beats"]:
+                print("Neue Beats, neues Glück!")
+                newConfiguration, shot, lastcut, target, linetarget =\
+                self.calculateForNewBeats(blockInformation, shot, frame, lastcut, False)
+            else: # There were no new beats or it's too early to cut
+                optimalConfiguration = self.getOptimum(frame, target, linetarget, shot,
+                    lastcut)
+                newConfiguration = self.springConfigurator(optimalConfiguration)
+                #newConfiguration = optimalConfiguration #uncomment to remove smoothing
+            if prefetched:
+                # the decision is known, the classifier can go on with the next block
+                self.prefetchClassifier(lastcut)
+            self.setConfiguration(newConfiguration, target, frame)
+        self.adapter.finish()
+        return self.plan
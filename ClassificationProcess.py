@@ -2,40 +2,25 @@
 # -*- coding: utf-8 -*-
 
 # =============================== Imports ======================================
-from multiprocessing import Process, Queue, Lock
-import pickle
 import sys
 
-from sklearn import preprocessing
-
-from Config import TRAIN_FILES, PERSON, OBJECT, PLACE
-from Classify import getDataMatrix, trainSVM, classifyForShot, classifyForCut
-from Beatscript import readContext, readBeatscript, getBeatsBetweenFrames
+from Config import PERSON, OBJECT, PLACE
+from Classify import classifyBlock
+from Beatscript import readContext, readBeatscript, FrameIndex
+from ModelBundle import getModelBundle
+from Protocol import ENTITIES, BLOCK, ADVANCE, SCHEDULE, DECISION, QUIT
+from Protocol import getBinaryStreams, readMessage, writeMessage
 import Features
 
-# =============================== Methods ======================================
-def trainWithAllExamples(shot):
-    training_data, training_data_classes = getDataMatrix(TRAIN_FILES, shot)
-    scaler = preprocessing.Scaler()
-    training_data = scaler.fit_transform(training_data, training_data_classes)
-    lock = Lock()
-    svmReturnQueue = Queue()
-    svmLearningProcess = Process(target=trainSVM,
-        args=(training_data, training_data_classes, svmReturnQueue, lock))
-    svmLearningProcess.start()
-    svmClassifier = svmReturnQueue.get()
-    svmLearningProcess.join()
-    return (svmClassifier,), scaler
-
 # =============================== Interactions =========================================
-def printListOfEntities(context):
-    persons = [entity for name, entity in context["Entities"].items() if
+def getListOfEntities(context):
+    persons = [entity.name for name, entity in context["Entities"].items() if
                entity.type == PERSON]
-    objects = [entity for name, entity in context["Entities"].items() if
+    objects = [entity.name for name, entity in context["Entities"].items() if
                entity.type == OBJECT]
-    places = [entity for name, entity in context["Entities"].items() if
+    places = [entity.name for name, entity in context["Entities"].items() if
               entity.type == PLACE]
-    pickle.dump({"Persons": persons, "Objects": objects, "Places": places}, sys.stdout)
+    return {"Persons": persons, "Objects": objects, "Places": places}
 
 # =============================== Main =========================================
 def determine_targets(context, current_block):
@@ -92,17 +77,83 @@ def determine_targets(context, current_block):
         if linetarget.type == PERSON and target.type != PERSON:
             target, linetarget = linetarget, target
 
-    # write
-    sys.stdout.write(target.name + "\t" + linetarget.name + "\n")
+    return target, linetarget
+
+
+class ClassificationSession:
+    """
+    Holds the state of the classification of a beatscript and answers the commands
+    of the Protocol.
+    """
+
+    def __init__(self, beatscript, context, bundle):
+        self.frameIndex = FrameIndex(beatscript)
+        self.context = context
+        self.classifiers, self.scaler = bundle["shot"]
+        self.cutClassifiers, self.cutScaler = bundle["cut"]
+        Features.initializeContextVars(self.context)
+        self.context["BygoneBlocks"] = []
+        self.current_frame = 0
+        self.lastBlock = self.frameIndex.getBeatsBetweenFrames(-1, 0)
+        self.classifyLastBlock()
+
+    def classifyLastBlock(self):
+        self.dist, self.cutBeforeThisClassification = classifyBlock(self.lastBlock,
+            self.context, self.classifiers, self.scaler, self.cutClassifiers,
+            self.cutScaler)
+
+    def getBlockInformation(self):
+        target, linetarget = determine_targets(self.context, self.lastBlock)
+        return {"distribution": self.dist,
+                "targets": (target.name, linetarget.name),
+                "cut": bool(self.cutBeforeThisClassification[0] <
+                            self.cutBeforeThisClassification[1])}
+
+    def advance(self, new_frame):
+        """
+        Checks the frame number for a new block. If there is one, it is classified and
+        its information is returned too.
+        """
+        beatList = self.frameIndex.getBeatsBetweenFrames(self.current_frame, new_frame)
+        self.current_frame = new_frame
+        if not beatList:
+            return {"new_beats": False}
+        self.context["BygoneBlocks"].append(self.lastBlock)
+        self.lastBlock = beatList
+        self.classifyLastBlock()
+        result = {"new_beats": True}
+        result.update(self.getBlockInformation())
+        return result
+
+    def receiveDecision(self, decision):
+        for beat in self.lastBlock:
+            beat.shot = decision
+        return True
+
+    def execute(self, command):
+        name, arguments = command[0], command[1:]
+        if name == ENTITIES:
+            return getListOfEntities(self.context)
+        elif name == BLOCK:
+            return self.getBlockInformation()
+        elif name == ADVANCE:
+            return self.advance(int(arguments[0]))
+        elif name == SCHEDULE:
+            return self.frameIndex.getBlockStartFrames()
+        elif name == DECISION:
+            return self.receiveDecision(int(arguments[0]))
+        elif name == QUIT:
+            return True
+        else:
+            raise ValueError("Unknown command: " + str(name))
 
 
 def main():
     if len(sys.argv) < 2:
         print("Usage: python ClassificationProcess.py <Beatscript-Filename>")
         return 1
-    # Initialization and Training
-    classifiers, scaler = trainWithAllExamples(True)
-    cutClassifiers, cutScaler = trainWithAllExamples(False)
+    # Initialization: load the trained classifiers or train them if necessary
+    bundle = getModelBundle()
     try:
         beatscript_file = open(sys.argv[1], "r")
     except IOError:
@@ -110,67 +161,21 @@ def main():
         print("Usage: python ClassificationProcess.py <Beatscript-Filename>")
         return 1
     lines = beatscript_file.readlines()
-    context = readContext(lines)#
+    context = readContext(lines)
     beatscript = readBeatscript(lines, context)
-    Features.initializeContextVars(context)
-    beatList = getBeatsBetweenFrames(beatscript, -1, 0)
-    current_frame = 0
-    lastBlock = beatList
-    context["BygoneBlocks"] = []
+    session = ClassificationSession(beatscript, context, bundle)
     sys.stdout.write("Training finished." + "\n")
     sys.stdout.flush()
-    # Get Distribution
-    dist = classifyForShot(lastBlock, context, classifiers, scaler)
-    cutBeforeThisClassification = classifyForCut(lastBlock, context, cutClassifiers,
-        cutScaler)
+    # From now on only messages of the Protocol are exchanged
+    inStream, outStream = getBinaryStreams()
     while True:
-        choice = raw_input("")
-        if choice == "e":
-            printListOfEntities(context)
-        elif choice == "t": # get the names of the target and the linetarget
-            determine_targets(context, lastBlock)
-        elif choice == "p": # print out the classification propabilities
-            pickle.dump(dist, sys.stdout)
-
-        elif choice == "c": # Print out, if we should cut at this point
-            blockList = []
-            decisions = []
-            for block in context["BygoneBlocks"]:
-                blockList.append(block)
-                decisions.append(block[0].shot)
-            blockList.append(lastBlock)
-            decisions.append(dist.index(max(dist)))
-            if cutBeforeThisClassification[0] < cutBeforeThisClassification[1]:
-                sys.stdout.write("yes\n")
-            else:
-                sys.stdout.write("no\n")
-
-        elif choice == "f": # check framenumber for a new block
-            new_frame = int(raw_input(""))
-            beatList = getBeatsBetweenFrames(beatscript, current_frame, new_frame)
-            current_frame = new_frame
-            if beatList :
-                context["BygoneBlocks"].append(lastBlock)
-                lastBlock = beatList
-                dist = classifyForShot(lastBlock, context, classifiers, scaler)
-                cutBeforeThisClassification = classifyForCut(lastBlock, context, cutClassifiers, cutScaler)
-                sys.stdout.write("yes\n")
-            else:
-                sys.stdout.write("no\n")
-
-        elif choice == "d": # recieve the decision for the lastBlock
-            decision = int(raw_input(""))
-            for beat in lastBlock:
-                beat.shot = decision
-            sys.stdout.write("decision recieved\n")
-
-        elif choice == "q": # quit...
-            sys.stdout.write("exiting...\n")
-            sys.stdout.flush()
+        try:
+            commands = readMessage(inStream)
+        except EOFError:
+            break
+        writeMessage(outStream, [session.execute(command) for command in commands])
+        if QUIT in [command[0] for command in commands]:
             break
-        else:
-            sys.stdout.write("You didn't enter something useful.\n")
-        sys.stdout.flush()
 
 
 if __name__ == "__main__":
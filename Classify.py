@@ -2,8 +2,6 @@
 # -*- coding: utf-8 -*-
 
 # =============================== Imports ======================================
-from multiprocessing import Process, Queue
-
 import numpy as np
 from sklearn import svm
 #from sklearn import neighbors
@@ -11,27 +9,30 @@ from sklearn import svm
 #from sklearn import linear_model
 #from sklearn import naive_bayes
 
-from ConvertData import getSingleFeatureLine, getFeatureLinesFromFile, getFeatureLine
-from Config import SHOT_NAMES, DETAIL, CLOSEUP, MEDIUM_SHOT, AMERICAN_SHOT
+from ConvertData import getSingleFeatureLine, getFeatureMatrixFromFile, getFeatureLine
+from FeatureCache import getFeatureMatrix
+from Config import USE_FEATURE_CACHE
+from Config import DETAIL, CLOSEUP, MEDIUM_SHOT, AMERICAN_SHOT
 from Config import ACTION, SAYS, INTRODUCE, EXPRESS, SHOW
 
 # =============================== Methods ======================================
 def getDataMatrix(file_set, shot=True, leave_out_class=None):
     """
     Returns an Numpy-Array with the feature_lines converted from all the beatscripts
-    mentioned in files.
+    mentioned in files. The feature-matrices of the beatscripts are taken from the
+    FeatureCache if USE_FEATURE_CACHE is set.
     """
-    matrix = []
-    classes = []
+    matrices = []
+    class_vectors = []
     for file in file_set:
-        feature_lines = getFeatureLinesFromFile(file, shot, leave_out_class=leave_out_class)
-        for line in feature_lines:
-            if shot:
-                classes.append(SHOT_NAMES.index(line.pop()))
-            else:
-                classes.append(int(line.pop()=="True"))
-            matrix.append(np.array(line))
-    return np.array(matrix, dtype=np.float64), np.array(classes)
+        if USE_FEATURE_CACHE:
+            matrix, classes = getFeatureMatrix(file, shot, leave_out_class=leave_out_class)
+        else:
+            matrix, classes = getFeatureMatrixFromFile(file, shot,
+                leave_out_class=leave_out_class)
+        matrices.append(matrix)
+        class_vectors.append(classes)
+    return np.concatenate(matrices), np.concatenate(class_vectors)
 
 
 def normalizeDist(distribution):
@@ -170,15 +171,10 @@ def cutBeforeThisBlock(blockList, decisions, keepingPropability):
 def distributionOfClassification(feature_line, classifiers, dist):
     """
     Calculates a distribution using the first of the given classifiers and the scaled
-    data from feature_line.
-    """
-    svm = classifiers[0]
-    svmDistributionReturnQueue = Queue()
-    computeSVMDistribution = Process(target=calculateDistribution,
-                                     args=(svm, feature_line, svmDistributionReturnQueue))
-    computeSVMDistribution.start()
-    svmDistribution = svmDistributionReturnQueue.get()
-    computeSVMDistribution.join()
+    data from feature_line. The fitted classifier stays in this process, so the
+    prediction is done directly without starting a Process for it.
+    """
+    svmDistribution = calculateDistribution(classifiers[0], feature_line)
     # this is a hack for classifiers with less useful propabilities (eg. Decision Tree)
     #return smoothDistribution(dist)
     # use this for SVMs
@@ -216,6 +212,22 @@ def classifyForCut(block, context, classifiers, scaler):
     return distributionOfClassification(feature_line, classifiers, dist=[0, 0])
 
 
+def classifyBlock(block, context, classifiers, scaler, cutClassifiers, cutScaler):
+    """
+    Constructs the feature-line from the block and the history in context only once
+    and uses it for both classifications. The feature-line is scaled with the scaler
+    of each classifier. The distribution of the shots and the distribution for the
+    decision if there should be a cut are returned.
+    """
+    feature_line = getFeatureLine(context, block, True, -1)
+    feature_line.pop()
+    shot_distribution = distributionOfClassification(scaler.transform(feature_line),
+        classifiers, dist=[0, 0, 0, 0, 0, 0, 0])
+    cut_distribution = distributionOfClassification(cutScaler.transform(feature_line),
+        cutClassifiers, dist=[0, 0])
+    return shot_distribution, cut_distribution
+
+
 def pointMetric(guessed_class, correct_class, previous_guessed_class,
                 previous_correct_class):
     if correct_class == DETAIL:
@@ -63,4 +63,11 @@ TRAIN_FILES = ["Berg der Versuchung - Schwere Stelle.csv",
 
 PROJECT_PATH = path.dirname(path.abspath(__file__))
 
-TRAIN_FILES = [path.abspath(path.join(PROJECT_PATH, "beatscripts", f)) for f in TRAIN_FILES]
\ No newline at end of file
+TRAIN_FILES = [path.abspath(path.join(PROJECT_PATH, "beatscripts", f)) for f in TRAIN_FILES]
+# Feature-matrices of the beatscripts are cached here. Set USE_FEATURE_CACHE to False to
+# always recompute the features.
+USE_FEATURE_CACHE = True
+FEATURE_CACHE_PATH = path.join(PROJECT_PATH, "featurecache")
+
+# The trained classifiers are stored here. Build it with "python ModelBundle.py".
+MODEL_BUNDLE_FILE = path.join(PROJECT_PATH, "automoculus_model.pickle")
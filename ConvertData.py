@@ -6,6 +6,8 @@ from copy import deepcopy
 import random
 import sys
 
+import numpy as np
+
 import Features
 
 from Config import SHOT_NAMES
@@ -17,13 +19,9 @@ from Beatscript import getContextAndBeatListFromFile
 
 def createDataLine(context, block, leaveout=-1):
     dataLine = [str(block[0].shotId) + "_" + str(block[0].beatId), str(block[0].shot)]
-    featureClassList = Features.getAllFeatureClasses()
     context = Features.createBeatList(context, block)
-    for featureClass in featureClassList:
-        feature = featureClass(context, block)
-        dataLine += feature.getNumbers()
-        # activate to generate a human readable featureLine
-        #dataLine.append(feature.getText())
+    dataLine += Features.getFeaturePlan(Features.ALL_FEATURES).calculateNumbers(context,
+        block)
     if leaveout >= 0:
         dataLine.pop(leaveout)
     return dataLine
@@ -32,20 +30,13 @@ def createDataLine(context, block, leaveout=-1):
 def getFeatureLine(context, block, shot, lastShotId, leave_out_class=None):
     """
     This function creates a featureLine. This is done by calculating getNumbers() for
-    all Feature-Classes in Features.py and appending the desired class. A featureLine
-    consists of several Numbers and a String at the end for the class.
+    the active Feature-Classes in Features.py (except leave_out_class if given) and
+    appending the desired class. A featureLine consists of several Numbers and a
+    String at the end for the class.
     """
-    line = []
-    featureClassList = Features.getAllFeatureClasses()
     context = Features.createBeatList(context, block)
-    # use all features except leave_out_class if given
-    #for featureClass in [x for x in featureClassList if x != leave_out_class]:
-    # use only features which contribute significant information
-    for featureClass in [featureClassList[x] for x in range(len(featureClassList)) if
-                         x in [9, 10, 11, 12, 13, 15, 19, 25, 27, 28, 30, 31, 32, 33, 37,
-                               39, 41, 42]]:
-        feature = featureClass(context, block)
-        line += feature.getNumbers()
+    plan = Features.getFeaturePlan(leave_out=leave_out_class)
+    line = plan.calculateNumbers(context, block)
     if shot:
         line.append(SHOT_NAMES[block[0].shot])
     else:#is there a cut?
@@ -57,16 +48,12 @@ def getFeatureNames(leave_out_class=None):
     """
     Returns an array of feature names corresponding to the featureLine.
     """
-    names = []
-    featureClassList = Features.getAllFeatureClasses()
     context = createContext()
     dummy_beat = Beat("0_1\tfull_shot\tfalse\tintroduce\tperson§Nobody", context)
     context = Features.createBeatList(context, [dummy_beat])
     Features.initializeContextVars(context)
-    for featureClass in [x for x in featureClassList if x != leave_out_class]:
-        feature = featureClass(context, [dummy_beat])
-        names += feature.getNames()
-    return names
+    plan = Features.getFeaturePlan(Features.ALL_FEATURES, leave_out=leave_out_class)
+    return plan.getNames(context, [dummy_beat])
 
 
 def createFeatureLines(context, beatList, shot, leave_out_class=None):
@@ -85,6 +72,31 @@ def createFeatureLines(context, beatList, shot, leave_out_class=None):
     return featureLines
 
 
+def createFeatureMatrix(context, beatList, shot, leave_out_class=None):
+    """
+    Returns a NumPy-matrix with one row of features for every block in beatList and
+    a vector with the corresponding classes. The class is the shot of the block if
+    shot is True, otherwise it is 1 if there is a cut before the block and 0 if not.
+    The features are written directly into the preallocated matrix.
+    """
+    blockList = coalesceBeats(beatList)
+    Features.initializeContextVars(context)
+    plan = Features.getFeaturePlan(leave_out=leave_out_class)
+    matrix = np.empty((len(blockList), plan.width), dtype=np.float64)
+    classes = np.empty(len(blockList), dtype=int)
+    lastShotId = -1
+    for i, block in enumerate(blockList):
+        context = Features.createBeatList(context, block)
+        plan.writeNumbers(context, block, matrix[i])
+        if shot:
+            classes[i] = block[0].shot
+        else:
+            classes[i] = int(lastShotId != block[0].shotId)
+        context["BygoneBlocks"].append(block)
+        lastShotId = block[-1].shotId
+    return matrix, classes
+
+
 def getFeatureLinesFromFile(file, shot, leave_out_class=None):
     """
     Returns a list of featureLines converted from the beatscript given in file.
@@ -93,6 +105,14 @@ def getFeatureLinesFromFile(file, shot, leave_out_class=None):
     return createFeatureLines(context, beatList, shot, leave_out_class)
 
 
+def getFeatureMatrixFromFile(file, shot, leave_out_class=None):
+    """
+    Returns the feature-matrix and the classes for the beatscript given in file.
+    """
+    context, beatList = getContextAndBeatListFromFile(file)
+    return createFeatureMatrix(context, beatList, shot, leave_out_class)
+
+
 def getFeatureLinesFromFileAndModify(file, shot, leave_out=-1):
     """
     Creates featureLines by blowing up the data with duplicating SAYS in some
@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# =============================== Imports ======================================
+import hashlib
+import os
+from os import path
+import tempfile
+
+import numpy as np
+
+import Beatscript
+import Config
+import ConvertData
+import Features
+from Config import FEATURE_CACHE_PATH, TRAIN_FILES
+
+# =============================== Fingerprints =================================
+def hashFile(filename):
+    """
+    Returns the SHA1-hexdigest of the content of the given file.
+    """
+    file_hash = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def getSourceFile(module):
+    return path.splitext(path.abspath(module.__file__))[0] + ".py"
+
+
+# The features depend on the code which parses the beatscripts, builds the blocks and
+# calculates the numbers and on Config (e.g. SHOT_NAMES and BEAT_TYPE_NAMES set the
+# widths of some features). If any of these files changes the cache is invalidated.
+FEATURE_CODE_FINGERPRINT = "".join([hashFile(getSourceFile(module)) for module in
+                                    [Beatscript, Config, ConvertData, Features]])
+
+
+def getFeatureFingerprint(shot, leave_out_class=None):
+    """
+    Returns a fingerprint of the feature code and the selection of features.
+    """
+    plan = Features.getFeaturePlan(leave_out=leave_out_class)
+    fingerprint = hashlib.sha1(FEATURE_CODE_FINGERPRINT.encode("utf-8"))
+    fingerprint.update("\t".join(plan.names).encode("utf-8"))
+    fingerprint.update(b"shot" if shot else b"cut")
+    return fingerprint.hexdigest()
+
+
+def getCacheFilenames(file, shot, leave_out_class=None):
+    """
+    Returns the filenames of the cached feature-matrix and classes for the
+    beatscript given in file.
+    """
+    key = hashFile(file) + "_" + getFeatureFingerprint(shot, leave_out_class)
+    return (path.join(FEATURE_CACHE_PATH, key + "_features.npy"),
+            path.join(FEATURE_CACHE_PATH, key + "_classes.npy"))
+
+# =============================== Methods ======================================
+def saveArray(filename, array):
+    """
+    Saves the array to a temporary file first and moves it to filename afterwards,
+    so parallel processes never read a partially written file.
+    """
+    handle, temp_filename = tempfile.mkstemp(dir=path.dirname(filename), suffix=".tmp")
+    with os.fdopen(handle, "wb") as f:
+        np.save(f, array)
+    os.rename(temp_filename, filename)
+
+
+def getFeatureMatrix(file, shot, leave_out_class=None, mmap_mode="r"):
+    """
+    Returns the feature-matrix and the classes for the beatscript given in file.
+    If they were calculated before with the same beatscript and the same feature
+    code they are loaded from the cache (memory-mapped if mmap_mode is given).
+    Otherwise they are calculated and saved to the cache.
+    """
+    matrix_filename, classes_filename = getCacheFilenames(file, shot, leave_out_class)
+    try:
+        return (np.load(matrix_filename, mmap_mode=mmap_mode),
+                np.load(classes_filename, mmap_mode=mmap_mode))
+    except IOError:
+        pass
+    matrix, classes = ConvertData.getFeatureMatrixFromFile(file, shot, leave_out_class)
+    if not path.isdir(FEATURE_CACHE_PATH):
+        try:
+            os.makedirs(FEATURE_CACHE_PATH)
+        except OSError:
+            pass # created by a parallel process
+    saveArray(classes_filename, classes)
+    saveArray(matrix_filename, matrix)
+    return matrix, classes
+
+
+def clearCache():
+    """
+    Removes all cached feature-matrices.
+    """
+    if path.isdir(FEATURE_CACHE_PATH):
+        for filename in os.listdir(FEATURE_CACHE_PATH):
+            if filename.endswith(".npy"):
+                os.remove(path.join(FEATURE_CACHE_PATH, filename))
+
+# =============================== Main =========================================
+def main():
+    """
+    Fills the cache for all training files.
+    """
+    for shot in [True, False]:
+        for file in TRAIN_FILES:
+            getFeatureMatrix(file, shot)
+    print("Feature cache filled: " + FEATURE_CACHE_PATH)
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ from Config import SHOT_NAMES
 from Config import BEAT_TYPE_NAMES, DEMONSTRAT_TYPE_NAMES
 from Config import INTRODUCE, EXPRESS, SAYS, ACTION, SHOW
 from Config import PERSON, OBJECT, PLACE
+from Beatscript import Beat, createContext
 
 CURRENT_MODULE = sys.modules[__name__]
 
@@ -1885,26 +1886,167 @@ class X_ObjectAct(Feature):
         return ["Wird ein Objekt gezeigt?", "Detail zeigen möglich?"]
 
 
+# =============================== Feature Registry =============================
+class FeatureInfo:
+    """
+    Describes a registered Feature-Class: its stable name, the class itself and
+    the columns it occupies in a line containing all features.
+    """
+
+    def __init__(self, name, featureClass, offset, width):
+        self.name = name
+        self.featureClass = featureClass
+        self.offset = offset
+        self.width = width
+
+    def getColumns(self):
+        return slice(self.offset, self.offset + self.width)
+
+
+class FeaturePlan:
+    """
+    A precompiled selection of Feature-Classes. The plan knows which columns of
+    the featureLine belong to which feature, so lines can be calculated and
+    sliced without discovering the classes again.
+    """
+
+    def __init__(self, names):
+        self.names = tuple(names)
+        self.featureClasses = [FEATURE_REGISTRY[name].featureClass for name in self.names]
+        self.offsets = {}
+        self.widths = {}
+        offset = 0
+        for name in self.names:
+            self.offsets[name] = offset
+            self.widths[name] = FEATURE_REGISTRY[name].width
+            offset += self.widths[name]
+        self.width = offset
+
+    def getColumns(self, name):
+        return slice(self.offsets[name], self.offsets[name] + self.widths[name])
+
+    def calculateNumbers(self, context, block):
+        """
+        Returns the numbers of all features in the plan. The BeatList in the
+        context has to be created before.
+        """
+        numbers = []
+        for featureClass in self.featureClasses:
+            numbers += featureClass(context, block).getNumbers()
+        return numbers
+
+    def writeNumbers(self, context, block, row):
+        """
+        Writes the numbers of all features in the plan into the columns of row,
+        which is usually a row of a preallocated NumPy matrix. Raises a ValueError
+        if a feature does not write exactly its width.
+        """
+        for name, featureClass in zip(self.names, self.featureClasses):
+            numbers = featureClass(context, block).getNumbers()
+            if len(numbers) != self.widths[name]:
+                raise ValueError(name + " calculated " + str(len(numbers)) +
+                                 " numbers instead of " + str(self.widths[name]) + ".")
+            row[self.getColumns(name)] = numbers
+        return row
+
+    def getNames(self, context, block):
+        names = []
+        for featureClass in self.featureClasses:
+            names += featureClass(context, block).getNames()
+        return names
+
+
+def getFeatureName(feature):
+    """
+    Returns the stable name of a feature. feature may be a name or a Feature-Class.
+    """
+    if inspect.isclass(feature):
+        return feature.__name__
+    return feature
+
+
+def buildFeatureRegistry():
+    """
+    Collects all subclasses of Feature defined in, or imported into this module
+    and measures the number of columns each of them produces. This is done once
+    at import.
+    """
+    context = createContext()
+    dummy_beat = Beat("0_1\tfull_shot\tfalse\tintroduce\tperson§Nobody", context)
+    context = createBeatList(context, [dummy_beat])
+    initializeContextVars(context)
+    registry = {}
+    offset = 0
+    for name, obj in inspect.getmembers(CURRENT_MODULE):
+        if inspect.isclass(obj) and issubclass(obj, Feature) and (obj != Feature):
+            width = len(obj(context, [dummy_beat]).getNumbers())
+            registry[name] = FeatureInfo(name, obj, offset, width)
+            offset += width
+    return registry
+
+
+def getFeaturePlan(names=None, leave_out=None):
+    """
+    Returns the FeaturePlan for the given feature names (the ACTIVE_FEATURES by
+    default) without the feature leave_out. Plans are compiled only once.
+    """
+    if names is None:
+        names = ACTIVE_FEATURES
+    key = (tuple(names), getFeatureName(leave_out))
+    if key not in FEATURE_PLANS:
+        FEATURE_PLANS[key] = FeaturePlan([name for name in key[0] if name != key[1]])
+    return FEATURE_PLANS[key]
+
+
 # =============================== Helper Methods ===============================
 def getAllFeatureClasses():
     """
     Returns a list of all subclasses of Feature defined in, or imported into
     this module.
     """
-    featureClassList = []
-    for name, obj in inspect.getmembers(CURRENT_MODULE):
-        if inspect.isclass(obj) and issubclass(obj, Feature) and (obj != Feature):
-            featureClassList.append(obj)
-    return featureClassList
+    return [FEATURE_REGISTRY[name].featureClass for name in ALL_FEATURES]
 
 
 def createBeatList(context, block):
     """
-    This function reconstructs a beatList from the BygoneBlocks in the context
-    and the given new block.
+    This function updates the beatList so that it consists of the beats in the
+    BygoneBlocks in the context followed by the given new block.
     The beatList is saved in the context. It is necessary to do this before
     calculating a featureLine, because otherwise there is no correct BeatList
     in the context, which is used by the Feature-Classes.
+    The beatList is maintained incrementally: The block appended by the previous
+    call is retracted and only the blocks which were added to the BygoneBlocks
+    since then are appended. This keeps the feature extraction for a whole scene
+    linear. If the BygoneBlocks were replaced or shortened the beatList is
+    rebuilt from scratch.
     """
-    context["BeatList"] = [b for b in itertools.chain(*context["BygoneBlocks"])] + block
-    return context
\ No newline at end of file
+    bygone_blocks = context["BygoneBlocks"]
+    beat_list = context.get("BeatList")
+    known_bygone_count = context.get("BeatListBygoneCount", 0)
+    if beat_list is None or context.get("BeatListBygoneBlocks") is not bygone_blocks or\
+       known_bygone_count > len(bygone_blocks):
+        beat_list = [b for b in itertools.chain(*bygone_blocks)]
+    else:
+        del beat_list[len(beat_list) - context["BeatListBlockLength"]:]
+        for bygone_block in bygone_blocks[known_bygone_count:]:
+            beat_list.extend(bygone_block)
+    beat_list.extend(block)
+    context["BeatList"] = beat_list
+    context["BeatListBygoneBlocks"] = bygone_blocks
+    context["BeatListBygoneCount"] = len(bygone_blocks)
+    context["BeatListBlockLength"] = len(block)
+    return context
+
+
+# =============================== Registry Initialization ======================
+FEATURE_REGISTRY = buildFeatureRegistry()
+ALL_FEATURES = tuple(sorted(FEATURE_REGISTRY, key=lambda n: FEATURE_REGISTRY[n].offset))
+# Only the features which contribute significant information are used for classification
+ACTIVE_FEATURES = ("X_AppearanceAnalyzer", "X_BackgroundAction", "X_BlockBeatCount",
+                   "X_BlockBeatTypeCount", "X_BlockChangeBeatType", "X_BlockOfOneSubject",
+                   "X_DecidedShots", "X_HandwrittenCutCriteria", "X_KnownSubjectsInBlock",
+                   "X_LastTwelveBeatTypes", "X_ObjectAct", "X_PersonsInTheShot",
+                   "X_PlaceShowingBlock", "X_PreviousBlockChangeTargetChange",
+                   "X_ShotHistogram", "X_ShowingObject", "X_ShowingPlace",
+                   "X_TalkersGoSilent")
+FEATURE_PLANS = {}
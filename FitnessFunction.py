@@ -99,18 +99,111 @@ def getVisibilityFactor(genome, target, object):
 def getShotLimits(cameraOptimizer, shot):
     return SHOT_LIMITS[shot] * cameraOptimizer.target.height
 
+# ============================== Occluders =====================================
+# An occluder only counts if the angle between the occluder and the camera (seen from
+# the person) is smaller than OCCULTATION_CUTOFF times the angular radius of the
+# occluder. Beyond that occultationWeight is smaller than 1e-17, so for a camera inside
+# the sphere of createOccluders the culled occultation differs from the sum over all
+# occluders by less than their number times occultationWeight(OCCULTATION_CUTOFF).
+OCCULTATION_CUTOFF = 3.0
+
+
+class Occluders:
+    """
+    The genome independent part of the occultation of one person (or eye): the
+    directions from the person to all objects and other persons and their angular radii.
+    Occluders whose cone can not reach the sphere with the given center and radius are
+    culled.
+    """
+
+    def __init__(self, person, occluders, center, radius):
+        self.location = person.location
+        self.constant = 0.0
+        directions = []
+        betas = []
+        for occluder in occluders:
+            v = occluder.location - person.location
+            length = np.sqrt(v.dot(v))
+            beta = np.arcsin(occluder.radius / max(length, occluder.radius))
+            if not beta:
+                continue
+            if not length:
+                self.constant += occultationWeight(0.0)
+                continue
+            direction = v / length
+            d = center - person.location
+            center_dist = np.sqrt(d.dot(d))
+            if center_dist > radius:
+                theta = angle(direction, d)
+                if theta > OCCULTATION_CUTOFF * beta + np.arcsin(radius / center_dist):
+                    continue
+            directions.append(direction)
+            betas.append(beta)
+        self.directions = np.array(directions).reshape((len(directions), 3))
+        self.betas = np.array(betas)
+
+    def getOccultation(self, position):
+        w = position - self.location
+        lw = np.sqrt(w.dot(w))
+        if not lw:
+            return self.constant + np.sum(occultationWeight(np.zeros(len(self.betas))))
+        alphas = np.arccos(np.clip(self.directions.dot(w) / lw, -1.0, 1.0))
+        return self.constant + np.sum(occultationWeight(alphas / self.betas))
+
+    def getBatchOccultation(self, positions):
+        w = positions - self.location
+        lw = np.sqrt(np.sum(w * w, axis=1))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cosines = np.where(lw[:, np.newaxis] > 0,
+                w.dot(self.directions.T) / lw[:, np.newaxis], 1.0)
+        alphas = np.arccos(np.clip(cosines, -1.0, 1.0))
+        return self.constant + np.sum(occultationWeight(alphas / self.betas), axis=1)
+
+    def getOccultationGradient(self, position):
+        """
+        Returns the occultation and its gradient with respect to the position.
+        """
+        gradient = np.zeros(3)
+        w = position - self.location
+        lw = np.sqrt(w.dot(w))
+        if not lw:
+            return self.getOccultation(position), gradient
+        cosines = np.clip(self.directions.dot(w) / lw, -1.0, 1.0)
+        factors = np.arccos(cosines) / self.betas
+        sines = np.sqrt(1 - cosines * cosines)
+        inside = sines > 0
+        d_alphas = -(self.directions[inside] / lw - np.outer(cosines[inside], w / (lw * lw))) /\
+                   sines[inside, np.newaxis]
+        weights = occultationWeightDerivative(factors[inside]) / self.betas[inside]
+        gradient += weights.dot(d_alphas)
+        return self.constant + np.sum(occultationWeight(factors)), gradient
+
+
+def createOccluders(cameraOptimizer, shots):
+    """
+    Returns a dict with the Occluders of every person and every eye by name. Only
+    occluders which can hide a person from a camera near the target (in the distance of
+    any of the shots) are kept.
+    """
+    maxDist = max([getShotLimits(cameraOptimizer, shot)[1] for shot in shots])
+    radius = maxDist + cameraOptimizer.target.height
+    occluders = {}
+    for person in cameraOptimizer.personlist:
+        for part in [person, person.eye_L, person.eye_R]:
+            others = cameraOptimizer.objectlist + [somebody for somebody in
+                                                   cameraOptimizer.personlist if
+                                                   not somebody is part]
+            occluders[part.name] = Occluders(part, others, cameraOptimizer.target.location,
+                radius)
+    return occluders
+
 # ============================== Quality Functions =====================================
 def getPersonQuality(cameraOptimizer, genome, person, intensity):
     ax, ay = getImageAngles(genome, person)
     x = ax * 2.0 / cameraOptimizer.camera.aperture_angle
     y = ay * 2.0 * cameraOptimizer.camera.resolution_x / (
     cameraOptimizer.camera.aperture_angle * cameraOptimizer.camera.resolution_y)
-    occultation = 0
-    for object in cameraOptimizer.objectlist:
-        occultation += occultationWeight(getVisibilityFactor(genome, person, object))
-    for somebody in cameraOptimizer.personlist:
-        if not somebody is person:
-            occultation += occultationWeight(getVisibilityFactor(genome, person, somebody))
+    occultation = cameraOptimizer.occluders[person.name].getOccultation(genome[:3])
     return (personFitnessByImage(x, y) + occultation) * intensity
 
 def getObjectQuality(cameraOptimizer, genome, object):
@@ -136,21 +229,33 @@ def getHeightQuality(cameraOptimizer, genome):
 def getXAngleQuality(genome):
     return range0to1(genome[3] / pi)
 
-def getLineQuality(cameraOptimizer, genome):
+def createLineGeometry(cameraOptimizer):
+    """
+    Returns the normal vector of the line between target and linetarget and whether the
+    old camera is on the side of the line the normal vector points away from. Returns
+    None if there is no line.
+    """
     if not cameraOptimizer.linetarget or\
        cameraOptimizer.target is cameraOptimizer.linetarget:
-        return 0
-    if (cameraOptimizer.target.location == location(genome)).all():
-        return 10000
+        return None
     targettolinetarget = cameraOptimizer.linetarget.location -\
                          cameraOptimizer.target.location
     normalvector = np.cross(np.array([0, 0, -1]), targettolinetarget)
     olddiffvector = cameraOptimizer.target.location - location(
         cameraOptimizer.oldConfiguration)
     angletoold = angle(olddiffvector, normalvector)
+    return normalvector, angletoold > pi / 2
+
+
+def getLineQuality(cameraOptimizer, genome):
+    if cameraOptimizer.lineGeometry is None:
+        return 0
+    if (cameraOptimizer.target.location == location(genome)).all():
+        return 10000
+    normalvector, flipped = cameraOptimizer.lineGeometry
     diffvector = cameraOptimizer.target.location - location(genome)
     lineangle = angle(diffvector, normalvector)
-    lineangle = pi - lineangle if angletoold > pi / 2 else lineangle
+    lineangle = pi - lineangle if flipped else lineangle
     return lineQualityFunction(pi / 2 - lineangle)
 
 
@@ -187,6 +292,287 @@ def fitness(genome, cameraOptimizer):
     return quality
 
 
+# ============================== Batch Functions =====================================
+# These functions evaluate the fitness for a whole (N, 5)-array of genomes at once. They
+# compute the same values as the functions for single genomes above.
+
+def batchAngle(v1, v2):
+    """
+    Returns the angles between the rows of v1 and v2 (both (N, 3) or broadcastable).
+    """
+    lv1 = np.sqrt(np.sum(v1 * v1, axis=-1))
+    lv2 = np.sqrt(np.sum(v2 * v2, axis=-1))
+    lengths = lv1 * lv2
+    valid = lengths > 0
+    div = np.sum(v1 * v2, axis=-1) / np.where(valid, lengths, 1.0)
+    return np.where(valid, np.arccos(np.clip(div, -1.0, 1.0)), 0.0)
+
+
+def getBatchViewVectors(genomes):
+    """
+    Returns C and E rotated by each genome. This equals C.dot(rotate(genome)) and
+    E.dot(rotate(genome)) without building the rotation matrices.
+    """
+    cx = np.cos(-genomes[:, 3])
+    cz = np.cos(-genomes[:, 4])
+    sx = np.sin(-genomes[:, 3])
+    sz = np.sin(-genomes[:, 4])
+    c = -np.column_stack((sx * sz, sx * cz, cx))
+    e = np.column_stack((cz, -sz, np.zeros(len(genomes))))
+    return c, e
+
+
+def getBatchImageAngles(genomes, object, viewVectors=None):
+    c, e = viewVectors if viewVectors is not None else getBatchViewVectors(genomes)
+    p = object.location - genomes[:, :3]
+    ps = np.sum(p * c, axis=1)[:, np.newaxis] * c + np.sum(p * e, axis=1)[:, np.newaxis] * e
+    p_exists = np.any(p != 0, axis=1)
+    ps_exists = np.any(ps != 0, axis=1)
+    x_angle = np.where(ps_exists, batchAngle(c, ps), 10.0)
+    y_angle = batchAngle(p, ps)
+    y_angle = np.where((p - ps)[:, 2] < 0, -y_angle, y_angle)
+    return np.where(p_exists, x_angle, 10.0), np.where(p_exists, y_angle, 10.0)
+
+
+def getBatchPersonQuality(cameraOptimizer, genomes, person, intensity, viewVectors=None):
+    ax, ay = getBatchImageAngles(genomes, person, viewVectors)
+    x = ax * 2.0 / cameraOptimizer.camera.aperture_angle
+    y = ay * 2.0 * cameraOptimizer.camera.resolution_x / (
+    cameraOptimizer.camera.aperture_angle * cameraOptimizer.camera.resolution_y)
+    occultation = cameraOptimizer.occluders[person.name].getBatchOccultation(genomes[:, :3])
+    return (personFitnessByImage(x, y) + occultation) * intensity
+
+
+def getBatchDistQuality(cameraOptimizer, genomes, shot):
+    v = genomes[:, :3] - cameraOptimizer.target.location
+    dist = np.sqrt(np.sum(v * v, axis=1))
+    minDist, maxDist = getShotLimits(cameraOptimizer, shot)
+    return distanceFitnessByRange(2 * (dist - minDist) / (maxDist - minDist) - 1)
+
+
+def getBatchHeightQuality(cameraOptimizer, genomes):
+    heightdiff = genomes[:, 2] - cameraOptimizer.target.location[2]
+    return 100 * heightdiff * heightdiff
+
+
+def getBatchXAngleQuality(genomes):
+    return range0to1(genomes[:, 3] / pi)
+
+
+def getBatchLineQuality(cameraOptimizer, genomes):
+    if cameraOptimizer.lineGeometry is None:
+        return np.zeros(len(genomes))
+    normalvector, flipped = cameraOptimizer.lineGeometry
+    diffvector = cameraOptimizer.target.location - genomes[:, :3]
+    lineangle = batchAngle(diffvector, normalvector)
+    lineangle = pi - lineangle if flipped else lineangle
+    quality = lineQualityFunction(pi / 2 - lineangle)
+    return np.where(np.all(diffvector == 0, axis=1), 10000, quality)
+
+
+def batchFitness(genomes, cameraOptimizer):
+    """
+    Returns the fitness of every row in the (N, 5)-array genomes. The values are the
+    same as fitness(genome, cameraOptimizer) for each row.
+    """
+    genomes = np.atleast_2d(np.asarray(genomes, dtype=np.float64))
+    viewVectors = getBatchViewVectors(genomes)
+    quality = np.ones(len(genomes)) * 0.1
+    #Personen im Bild
+    for person in cameraOptimizer.personlist:
+        targetFactor = 1.0 if person is cameraOptimizer.target else 0.1
+        for part in [person, person.eye_L, person.eye_R]:
+            quality += targetFactor * getBatchPersonQuality(cameraOptimizer, genomes, part,
+                targetFactor * 12, viewVectors)
+    #Entfernung zur Kamera
+    quality += getBatchDistQuality(cameraOptimizer, genomes, cameraOptimizer.shot)
+    #Höhe der Kamera
+    quality += getBatchHeightQuality(cameraOptimizer, genomes)
+    #Kein Überdrehen der X-Rotation
+    quality += getBatchXAngleQuality(genomes)
+    #Ebener Blick
+    quality += genomes[:, 4] * genomes[:, 4] * 0.01
+    #Achsenspruenge?
+    quality += getBatchLineQuality(cameraOptimizer, genomes)
+    #Sprunghaftigkeit?
+    quality += np.sum((genomes[:, 3:] - cameraOptimizer.oldConfiguration[3:]) ** 2, axis=1)
+    return quality
+
+
+# ============================== Gradient Functions ==================================
+# These functions return the value of a quality function together with its gradient with
+# respect to the genome. They are derived by hand from the functions above.
+
+def personFitnessByImageGradient(x, y):
+    """
+    Returns personFitnessByImage(x, y) and its derivatives with respect to x and y.
+    """
+    x2 = x * x
+    y2 = y * y
+    exponential = np.exp(-0.5 * x2 ** 5 - 0.5 * y2 ** 5)
+    polynomial = ((7 * x2 - 4.5) * x2 - 9) + ((10 * y2 - 4.5) * y2 - 2 * y - 9)
+    image = exponential * polynomial + 21.2
+    border = 1 + (abs(x) + abs(y)) * 0.1
+    d_image_x = exponential * (-5 * x2 ** 4 * x * polynomial + 28 * x2 * x - 9 * x)
+    d_image_y = exponential * (-5 * y2 ** 4 * y * polynomial + 40 * y2 * y - 9 * y - 2)
+    return (image * border, d_image_x * border + image * 0.1 * np.sign(x),
+            d_image_y * border + image * 0.1 * np.sign(y))
+
+
+def distanceFitnessByRangeDerivative(x):
+    exponential = np.exp(-0.5 * x ** 4)
+    return 2000 * x ** 3 * exponential * (0.1 * abs(x) + 0.9) +\
+           (1000 - 1000 * exponential) * 0.1 * np.sign(x)
+
+
+def range0to1Derivative(x):
+    exponential = np.exp(-0.5 * x ** 10)
+    return 5000 * x ** 9 * exponential * (0.001 * abs(x) + 0.999) +\
+           (1000 - 1000 * exponential) * 0.001 * np.sign(x)
+
+
+def lineQualityFunctionDerivative(x):
+    return -0.05 / (0.001 + abs(x)) ** 2 * (2 - 5 * x) -\
+           5 * (50 - 50 * x / (0.001 + abs(x)))
+
+
+def occultationWeightDerivative(x):
+    return -6 * x ** 3 * np.exp(-0.5 * x ** 4)
+
+
+def angleGradient(v1, v2):
+    """
+    Returns angle(v1, v2) and its gradients with respect to v1 and v2.
+    """
+    lv1 = np.sqrt(v1.dot(v1))
+    lv2 = np.sqrt(v2.dot(v2))
+    if not (lv1 and lv2): return 0, np.zeros(3), np.zeros(3)
+    div = v1.dot(v2) / (lv1 * lv2)
+    if div >= 1.0: return 0, np.zeros(3), np.zeros(3)
+    if div <= -1.0: return pi, np.zeros(3), np.zeros(3)
+    factor = -1.0 / np.sqrt(1 - div * div)
+    d_v1 = factor * (v2 / (lv1 * lv2) - div * v1 / (lv1 * lv1))
+    d_v2 = factor * (v1 / (lv1 * lv2) - div * v2 / (lv2 * lv2))
+    return np.arccos(div), d_v1, d_v2
+
+
+def getImageAnglesGradient(genome, object):
+    """
+    Returns the angles of getImageAngles and their gradients with respect to the genome.
+    """
+    s3, c3 = np.sin(genome[3]), np.cos(genome[3])
+    s4, c4 = np.sin(genome[4]), np.cos(genome[4])
+    c = np.array([-s3 * s4, s3 * c4, -c3])
+    e = np.array([c4, s4, 0.0])
+    d_c3 = np.array([-c3 * s4, c3 * c4, s3])
+    d_c4 = np.array([-s3 * c4, -s3 * s4, 0.0])
+    d_e4 = np.array([-s4, c4, 0.0])
+    p = object.location - genome[:3]
+    if not p.any():
+        return 10, 10, np.zeros(5), np.zeros(5)
+    ps = p.dot(c) * c + p.dot(e) * e
+    projection = np.outer(c, c) + np.outer(e, e)
+    d_ps3 = p.dot(d_c3) * c + p.dot(c) * d_c3
+    d_ps4 = p.dot(d_c4) * c + p.dot(c) * d_c4 + p.dot(d_e4) * e + p.dot(e) * d_e4
+    d_x_angle = np.zeros(5)
+    if ps.any():
+        x_angle, d_c, d_ps = angleGradient(c, ps)
+        d_x_angle[:3] = -projection.dot(d_ps)
+        d_x_angle[3] = d_c.dot(d_c3) + d_ps.dot(d_ps3)
+        d_x_angle[4] = d_c.dot(d_c4) + d_ps.dot(d_ps4)
+    else:
+        x_angle = 10
+    y_angle, d_p, d_ps = angleGradient(p, ps)
+    d_y_angle = np.zeros(5)
+    d_y_angle[:3] = -(d_p + projection.dot(d_ps))
+    d_y_angle[3] = d_ps.dot(d_ps3)
+    d_y_angle[4] = d_ps.dot(d_ps4)
+    if (p - ps)[2] < 0:
+        y_angle *= -1
+        d_y_angle *= -1
+    return x_angle, y_angle, d_x_angle, d_y_angle
+
+
+def getPersonQualityGradient(cameraOptimizer, genome, person, intensity):
+    ax, ay, d_ax, d_ay = getImageAnglesGradient(genome, person)
+    x_factor = 2.0 / cameraOptimizer.camera.aperture_angle
+    y_factor = 2.0 * cameraOptimizer.camera.resolution_x / (
+    cameraOptimizer.camera.aperture_angle * cameraOptimizer.camera.resolution_y)
+    image, d_image_x, d_image_y = personFitnessByImageGradient(ax * x_factor, ay * y_factor)
+    gradient = d_image_x * x_factor * d_ax + d_image_y * y_factor * d_ay
+    occultation, d_occultation = cameraOptimizer.occluders[person.name].getOccultationGradient(
+        genome[:3])
+    gradient[:3] += d_occultation
+    return (image + occultation) * intensity, gradient * intensity
+
+
+def getDistQualityGradient(cameraOptimizer, genome, shot):
+    v = location(genome) - cameraOptimizer.target.location
+    dist = sqrt(v.dot(v))
+    minDist, maxDist = getShotLimits(cameraOptimizer, shot)
+    x = 2 * (dist - minDist) / (maxDist - minDist) - 1
+    gradient = np.zeros(5)
+    if dist:
+        gradient[:3] = distanceFitnessByRangeDerivative(x) * 2 / (maxDist - minDist) * v / dist
+    return distanceFitnessByRange(x), gradient
+
+
+def getLineQualityGradient(cameraOptimizer, genome):
+    gradient = np.zeros(5)
+    if cameraOptimizer.lineGeometry is None:
+        return 0, gradient
+    if (cameraOptimizer.target.location == location(genome)).all():
+        return 10000, gradient
+    normalvector, flipped = cameraOptimizer.lineGeometry
+    diffvector = cameraOptimizer.target.location - location(genome)
+    lineangle, d_diffvector, _ = angleGradient(diffvector, normalvector)
+    direction = 1
+    if flipped:
+        lineangle = pi - lineangle
+        direction = -1
+    # d(pi/2 - lineangle)/d(location) = -direction * d_diffvector * d(diffvector)/d(location)
+    gradient[:3] = lineQualityFunctionDerivative(pi / 2 - lineangle) * direction *\
+                   d_diffvector
+    return lineQualityFunction(pi / 2 - lineangle), gradient
+
+
+def fitnessAndGradient(genome, cameraOptimizer):
+    """
+    Returns fitness(genome, cameraOptimizer) and its gradient with respect to the genome.
+    """
+    quality = 0.1
+    gradient = np.zeros(5)
+    #Personen im Bild
+    for person in cameraOptimizer.personlist:
+        targetFactor = 1.0 if person is cameraOptimizer.target else 0.1
+        for part in [person, person.eye_L, person.eye_R]:
+            value, d_value = getPersonQualityGradient(cameraOptimizer, genome, part,
+                targetFactor * 12)
+            quality += targetFactor * value
+            gradient += targetFactor * d_value
+    #Entfernung zur Kamera
+    value, d_value = getDistQualityGradient(cameraOptimizer, genome, cameraOptimizer.shot)
+    quality += value
+    gradient += d_value
+    #Höhe der Kamera
+    quality += getHeightQuality(cameraOptimizer, genome)
+    gradient[2] += 200 * (genome[2] - cameraOptimizer.target.location[2])
+    #Kein Überdrehen der X-Rotation
+    quality += getXAngleQuality(genome)
+    gradient[3] += range0to1Derivative(genome[3] / pi) / pi
+    #Ebener Blick
+    quality += genome[4] * genome[4] * 0.01
+    gradient[4] += genome[4] * 0.02
+    #Achsenspruenge?
+    value, d_value = getLineQualityGradient(cameraOptimizer, genome)
+    quality += value
+    gradient += d_value
+    #Sprunghaftigkeit?
+    quality += np.sum((genome[3:] - cameraOptimizer.oldConfiguration[3:])**2)
+    gradient[3:] += 2 * (genome[3:] - cameraOptimizer.oldConfiguration[3:])
+    return quality, gradient
+
+
 # ================================ Plots =======================================
 def main():
     # make these smaller to increase the resolution
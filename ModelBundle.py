@@ -0,0 +1,110 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# =============================== Imports ======================================
+from multiprocessing import Process, Queue, Lock
+import hashlib
+import os
+import pickle
+import tempfile
+from os import path
+
+from sklearn import preprocessing
+
+import Classify
+import Config
+import Features
+from Classify import getDataMatrix, trainSVM
+from Config import TRAIN_FILES, MODEL_BUNDLE_FILE
+from FeatureCache import hashFile, getSourceFile, FEATURE_CODE_FINGERPRINT
+
+# Increase this if the content of the bundle changes.
+MODEL_BUNDLE_VERSION = 1
+
+# =============================== Training =====================================
+def trainWithAllExamples(shot):
+    training_data, training_data_classes = getDataMatrix(TRAIN_FILES, shot)
+    scaler = preprocessing.Scaler()
+    training_data = scaler.fit_transform(training_data, training_data_classes)
+    lock = Lock()
+    svmReturnQueue = Queue()
+    svmLearningProcess = Process(target=trainSVM,
+        args=(training_data, training_data_classes, svmReturnQueue, lock))
+    svmLearningProcess.start()
+    svmClassifier = svmReturnQueue.get()
+    svmLearningProcess.join()
+    return (svmClassifier,), scaler
+
+# =============================== Bundle =======================================
+def getCorpusFingerprint():
+    """
+    Returns a fingerprint of the training files, the feature code, the training code
+    (Classify sets the parameters of the SVMs), Config and the active features. A
+    bundle with a different fingerprint is stale.
+    """
+    fingerprint = hashlib.sha1(FEATURE_CODE_FINGERPRINT.encode("utf-8"))
+    for module in [Classify, Config]:
+        fingerprint.update(hashFile(getSourceFile(module)).encode("utf-8"))
+    for file in TRAIN_FILES:
+        fingerprint.update((path.basename(file) + hashFile(file)).encode("utf-8"))
+    fingerprint.update("\t".join(Features.getFeaturePlan().names).encode("utf-8"))
+    return fingerprint.hexdigest()
+
+
+def buildModelBundle():
+    """
+    Trains the classifiers for shots and cuts with all examples and returns them
+    together with their scalers in a bundle.
+    """
+    classifiers, scaler = trainWithAllExamples(True)
+    cutClassifiers, cutScaler = trainWithAllExamples(False)
+    return {"version": MODEL_BUNDLE_VERSION,
+            "corpus_fingerprint": getCorpusFingerprint(),
+            "features": Features.getFeaturePlan().names,
+            "shot": (classifiers, scaler),
+            "cut": (cutClassifiers, cutScaler)}
+
+
+def saveModelBundle(bundle, filename=MODEL_BUNDLE_FILE):
+    handle, temp_filename = tempfile.mkstemp(dir=path.dirname(filename), suffix=".tmp")
+    with os.fdopen(handle, "wb") as f:
+        pickle.dump(bundle, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.rename(temp_filename, filename)
+
+
+def loadModelBundle(filename=MODEL_BUNDLE_FILE):
+    """
+    Returns the bundle stored in filename or None if it is missing or stale.
+    """
+    try:
+        with open(filename, "rb") as f:
+            bundle = pickle.load(f)
+    except (IOError, EOFError, AttributeError, ImportError, pickle.UnpicklingError):
+        return None
+    if not isinstance(bundle, dict) or bundle.get("version") != MODEL_BUNDLE_VERSION:
+        return None
+    if bundle["features"] != Features.getFeaturePlan().names or\
+       bundle["corpus_fingerprint"] != getCorpusFingerprint():
+        return None
+    return bundle
+
+
+def getModelBundle(filename=MODEL_BUNDLE_FILE):
+    """
+    Loads the bundle from filename. If it is missing or stale the classifiers are
+    trained and the new bundle is saved.
+    """
+    bundle = loadModelBundle(filename)
+    if bundle is None:
+        print("No up-to-date model bundle found. Training...")
+        bundle = buildModelBundle()
+        saveModelBundle(bundle, filename)
+    return bundle
+
+# =============================== Main =========================================
+def main():
+    saveModelBundle(buildModelBundle())
+    print("Model bundle written: " + MODEL_BUNDLE_FILE)
+
+if __name__ == "__main__":
+    main()
@@ -2,39 +2,144 @@
 # -*- coding: utf-8 -*-
 
 # =============================== Imports ======================================
-import pickle
 import sys
+import time
+import traceback
 
 import numpy as np
-from multiprocessing import Queue, Process
+from multiprocessing import Queue, Process, cpu_count
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
 import scipy.optimize as opt
 
-from FitnessFunction import fitness, angle
+from FitnessFunction import fitness, fitnessAndGradient, batchFitness, angle, getShotLimits
+from FitnessFunction import createOccluders, createLineGeometry
+from Config import LONG_SHOT, EXTREME_LONG_SHOT
+from Protocol import getBinaryStreams, readMessage, writeMessage, writeError
+
+# =========================== Anytime optimization ============================
+class DeadlineExceeded(Exception):
+    pass
+
+
+class AnytimeObjective:
+    """
+    Wraps the objective function of an optimizer. It counts the evaluations, remembers
+    the best genome it was called with and raises DeadlineExceeded once the deadline
+    (a time.time() value) has passed. A deadline of None never passes.
+    """
+
+    def __init__(self, objective, deadline=None):
+        self.objective = objective
+        self.deadline = deadline
+        self.evaluations = 0
+        self.best = None
+        self.best_fitness = np.inf
+
+    def __call__(self, genome, *args):
+        if self.deadline is not None and time.time() > self.deadline:
+            raise DeadlineExceeded()
+        result = self.objective(genome, *args)
+        self.evaluations += 1
+        f = result[0] if isinstance(result, tuple) else result
+        if f < self.best_fitness:
+            self.best = np.array(genome)
+            self.best_fitness = f
+        return result
+
+
+def getDeadline(scene_snapshot):
+    """
+    Returns the deadline for the optimization of the scene_snapshot or None if it has
+    no time_budget.
+    """
+    if scene_snapshot.time_budget is None:
+        return None
+    return time.time() + scene_snapshot.time_budget
 
 # =========================== Optimizer class ==================================
-class CameraOptimizer:
-    def __init__(self,scene_snapshot, shot):
+# POWELL only needs the fitness. LBFGSB uses the analytic gradient of the fitness. Both
+# search inside the bounds of the shot (see CameraOptimizer.getBounds): LBFGSB directly,
+# POWELL evaluates the fitness at the genome clipped to the bounds plus BOUND_PENALTY
+# times the squared distance of the genome to the bounds.
+POWELL, LBFGSB = "powell", "l-bfgs-b"
+OPTIMIZATION_METHOD = POWELL
+BOUND_PENALTY = 1000.0
+
+# The search region of a shot is an annulus around the target (given by SHOT_LIMITS),
+# a height window of HEIGHT_WINDOW target heights around the target and all rotations
+# which do not turn the camera upside down. If the start between target and linetarget
+# lies outside the annulus SEED_COUNTS[shot] starting points spread over the annulus on
+# the side of the line where the camera was before are used instead. The long shots
+# converge worst, so they always get several seeds.
+HEIGHT_WINDOW = 1.0
+SEED_COUNTS = [1, 1, 1, 1, 1, 3, 3]
+WIDE_SHOTS = [LONG_SHOT, EXTREME_LONG_SHOT]
+SEED_SPREAD = np.pi / 3
+
+# The optional global search samples POPULATION_SIZE genomes per generation and
+# evaluates each generation with one call of batchFitness. The first generation is
+# spread over the whole search region, every further one is sampled around the
+# ELITE_SIZE best genomes so far with their spread (coarse to fine). The
+# GLOBAL_SEARCH_STARTS best genomes which are at least one target height apart are
+# additional starting points for the optimizer.
+GLOBAL_SEARCH = False
+POPULATION_SIZE = 200
+GENERATIONS = 6
+ELITE_SIZE = 20
+GLOBAL_SEARCH_STARTS = 2
+ROTATION_SPREAD = 0.3
+
+
+class SceneTerms:
+    """
+    Everything the fitness needs which does not depend on the shot: the scene as numpy
+    arrays, the geometry of the line and the occluders (kept for the widest of the
+    shots). It is computed once per SceneSnapshot and shared by the CameraOptimizers of
+    all shots.
+    """
+
+    def __init__(self, scene_snapshot, shots=None):
         self.target = convertToNumpy(scene_snapshot.target)
         self.linetarget = convertToNumpy(scene_snapshot.linetarget)
         self.camera = scene_snapshot.camera
         self.personlist = [convertToNumpy(p) for p in scene_snapshot.persons]
         self.objectlist = [convertToNumpy(o) for o in scene_snapshot.objects]
         self.oldConfiguration = np.array(scene_snapshot.camera.getConfiguration())
+        self.lineGeometry = createLineGeometry(self)
+        self.occluders = createOccluders(self, shots or scene_snapshot.shots)
+
+
+class CameraOptimizer:
+    def __init__(self,scene_snapshot, shot, method=OPTIMIZATION_METHOD, terms=None):
+        if terms is None:
+            terms = SceneTerms(scene_snapshot, [shot])
+        self.target = terms.target
+        self.linetarget = terms.linetarget
+        self.camera = terms.camera
+        self.personlist = terms.personlist
+        self.objectlist = terms.objectlist
+        self.oldConfiguration = terms.oldConfiguration
+        self.lineGeometry = terms.lineGeometry
+        self.occluders = terms.occluders
+        self.warmStart = scene_snapshot.warm_start
         self.shot = shot
+        self.method = method
+        self.evaluations = 0
 
-    def optimize(self):
-        def runoptimizer(function, startvector, returnqueue):
-            o = opt.fmin_powell(func=function, x0=startvector, args=(self,))
-            # These optimizers turned out to be slower than powell
-            #o = opt.fmin_cg(f=function, x0=startvector)
-            #o = opt.fmin_bfgs(f=function, x0=startvector)
-            #o = opt.anneal(func=function, x0=startvector)
-            returnqueue.put((o, fitness(o, self)))
-
-        start = self.oldConfiguration
-        oldQueue = Queue(maxsize=1)
-        oldProcess = Process(target=runoptimizer, args=(fitness, start, oldQueue))
-        oldProcess.start()
+    def getStartVectors(self, global_search=GLOBAL_SEARCH):
+        """
+        Returns the starting points for the optimization: the old configuration, a
+        point between target and linetarget on the side of the line where the camera
+        was before (or the seed vectors if this point is outside the annulus of the
+        shot or the shot is one of the WIDE_SHOTS) and (with global_search) the best
+        results of the global search. For a warm start only the old configuration is
+        used.
+        """
+        if self.warmStart:
+            return [self.oldConfiguration]
         if self.linetarget:
             target_to_linetarget = self.linetarget.location - self.target.location
             normal_vector = np.cross(np.array([0, 0, -1]), target_to_linetarget)
@@ -49,17 +154,177 @@ class CameraOptimizer:
             start = np.hstack((new_start_position, self.oldConfiguration[3:5]))
         else:
             start = np.array([0, 0, 0, self.oldConfiguration[3], self.oldConfiguration[4]])
-        litQueue = Queue(maxsize=1)
-        litProcess = Process(target=runoptimizer, args=(fitness, start, litQueue))
-        litProcess.start()
-        o_old, f_o_old = oldQueue.get()
-        o_lit, f_o_lit = litQueue.get()
-        oldProcess.join()
-        litProcess.join()
-        if f_o_lit < f_o_old:
-            return o_lit, f_o_lit, self.shot
+        minDist, maxDist, _, _ = self.getSearchRegion()
+        if self.shot not in WIDE_SHOTS and\
+           minDist <= np.sqrt(np.sum((start[:3] - self.target.location) ** 2)) <= maxDist:
+            start_vectors = [self.oldConfiguration, start]
+        else:
+            start_vectors = [self.oldConfiguration] + self.getSeedVectors()
+        if global_search:
+            start_vectors += self.globalSearch()
+        return start_vectors
+
+    def getSearchRegion(self):
+        """
+        Returns the inner and outer radius of the annulus around the target and the
+        lowest and highest camera position for this shot.
+        """
+        minDist, maxDist = getShotLimits(self, self.shot)
+        height = self.target.location[2]
+        window = HEIGHT_WINDOW * self.target.height
+        return minDist, maxDist, height - window, height + window
+
+    def getSeedVectors(self, count=None):
+        """
+        Returns count (by default SEED_COUNTS of the shot) starting points in the middle
+        of the annulus looking at the target. They are centered around the direction of
+        the old camera (or the side of the line where the old camera was).
+        """
+        if count is None:
+            count = SEED_COUNTS[self.shot]
+        if count <= 0:
+            return []
+        minDist, maxDist, _, _ = self.getSearchRegion()
+        old_direction = self.oldConfiguration[:3] - self.target.location
+        if self.linetarget:
+            target_to_linetarget = self.linetarget.location - self.target.location
+            normal_vector = np.cross(np.array([0, 0, -1]), target_to_linetarget)
+            if angle(-old_direction, normal_vector) > np.pi / 2:
+                old_direction = normal_vector
+            else:
+                old_direction = -normal_vector
+        center_angle = np.arctan2(old_direction[1], old_direction[0])
+        if count == 1:
+            angles = [center_angle]
         else:
-            return o_old, f_o_old, self.shot
+            angles = center_angle + np.linspace(-SEED_SPREAD, SEED_SPREAD, count)
+        radius = (minDist + maxDist) / 2
+        seeds = []
+        for phi in angles:
+            position = self.target.location + radius * np.array([np.cos(phi), np.sin(phi), 0])
+            seeds.append(np.hstack((position, self.getLookAtRotation(position))))
+        return seeds
+
+    def globalSearch(self, population_size=POPULATION_SIZE, generations=GENERATIONS,
+                     count=GLOBAL_SEARCH_STARTS):
+        """
+        Returns up to count good genomes from the whole search region which are at least
+        one target height apart. The random numbers are seeded so the result only
+        depends on the snapshot.
+        """
+        random_state = np.random.RandomState(0)
+        minDist, maxDist, lowest, highest = self.getSearchRegion()
+        radius = np.sqrt(random_state.uniform(minDist ** 2, maxDist ** 2, population_size))
+        phi = random_state.uniform(-np.pi, np.pi, population_size)
+        positions = np.column_stack((self.target.location[0] + radius * np.cos(phi),
+                                     self.target.location[1] + radius * np.sin(phi),
+                                     random_state.uniform(lowest, highest, population_size)))
+        rotations = np.array([self.getLookAtRotation(position) for position in positions])
+        rotations += random_state.normal(0, ROTATION_SPREAD, rotations.shape)
+        coarse = np.hstack((positions, rotations))
+        coarse_values = batchFitness(coarse, self)
+        genomes, values = coarse, coarse_values
+        for _ in range(generations - 1):
+            elite_indices = np.argsort(values)[:ELITE_SIZE]
+            elite, elite_values = genomes[elite_indices], values[elite_indices]
+            parents = elite[random_state.randint(0, len(elite), population_size)]
+            population = parents + random_state.normal(0, 1, parents.shape) * elite.std(axis=0)
+            genomes = np.vstack((elite, population))
+            values = np.hstack((elite_values, batchFitness(population, self)))
+        genomes = np.vstack((genomes, coarse))
+        values = np.hstack((values, coarse_values))
+        starts = []
+        for i in np.argsort(values):
+            if all([np.sqrt(np.sum((genomes[i, :3] - start[:3]) ** 2)) > self.target.height
+                    for start in starts]):
+                starts.append(genomes[i])
+                if len(starts) >= count:
+                    break
+        return starts
+
+    def getLookAtRotation(self, position):
+        """
+        Returns the x- and z-rotation of a camera at position looking at the target.
+        The z-rotation is chosen as close as possible to the old configuration.
+        """
+        direction = self.target.location - position
+        length = np.sqrt(direction.dot(direction))
+        if not length:
+            return self.oldConfiguration[3:5]
+        x_rotation = np.arccos(np.clip(-direction[2] / length, -1.0, 1.0))
+        z_rotation = np.arctan2(-direction[0], direction[1])
+        old_z_rotation = self.oldConfiguration[4]
+        z_rotation = old_z_rotation + (z_rotation - old_z_rotation + np.pi) % (2 * np.pi) - np.pi
+        return np.array([x_rotation, z_rotation])
+
+    def getBounds(self):
+        """
+        Returns the bounds of the genome: the bounding box of the annulus and
+        the height window of the search region, an x-rotation between looking straight
+        down and straight up and one full turn of z-rotation around the old
+        configuration. The inner radius of the annulus is left to the fitness.
+        """
+        _, maxDist, lowest, highest = self.getSearchRegion()
+        x, y, _ = self.target.location
+        old_z_rotation = self.oldConfiguration[4]
+        return [(x - maxDist, x + maxDist), (y - maxDist, y + maxDist), (lowest, highest),
+                (0.0, np.pi), (old_z_rotation - np.pi, old_z_rotation + np.pi)]
+
+    def optimizeFrom(self, startvector, deadline=None):
+        """
+        Returns the optimized configuration, its fitness and whether the optimizer
+        converged. If the deadline passes first the best configuration found so far is
+        returned. The number of fitness evaluations is stored in self.evaluations.
+        """
+        try:
+            if self.method == LBFGSB:
+                objective = AnytimeObjective(fitnessAndGradient, deadline)
+                bounds = self.getBounds()
+                startvector = np.clip(startvector, [low for low, _ in bounds],
+                    [high for _, high in bounds])
+                o, f_o, _ = opt.fmin_l_bfgs_b(func=objective, x0=startvector,
+                    args=(self,), bounds=bounds)
+            else:
+                objective = AnytimeObjective(boundedFitness, deadline)
+                bounds = np.array(self.getBounds())
+                o = opt.fmin_powell(func=objective, x0=startvector,
+                    args=(self, bounds[:, 0], bounds[:, 1]), full_output=True)[0]
+                o = np.clip(o, bounds[:, 0], bounds[:, 1])
+                f_o = fitness(o, self)
+            # These optimizers turned out to be slower than powell
+            #o = opt.fmin_cg(f=fitness, x0=startvector)
+            #o = opt.fmin_bfgs(f=fitness, x0=startvector)
+            #o = opt.anneal(func=fitness, x0=startvector)
+            converged = True
+        except DeadlineExceeded:
+            if objective.best is None:
+                o, f_o = np.array(startvector), fitness(startvector, self)
+            elif self.method == LBFGSB:
+                o, f_o = objective.best, objective.best_fitness
+            else:
+                o = np.clip(objective.best, bounds[:, 0], bounds[:, 1])
+                f_o = fitness(o, self)
+            converged = False
+        self.evaluations = objective.evaluations
+        return o, f_o, converged
+
+    def optimize(self, deadline=None):
+        """
+        Optimizes from all starting points in this process and returns the best
+        configuration, its fitness, the shot and whether all optimizations converged.
+        """
+        results = [self.optimizeFrom(start, deadline) for start in self.getStartVectors()]
+        o, f_o, _ = min(results, key=lambda result: result[1])
+        return o, f_o, self.shot, all([result[2] for result in results])
+
+
+def boundedFitness(genome, cameraOptimizer, lower, upper):
+    """
+    The fitness of the genome clipped to the bounds plus BOUND_PENALTY times the squared
+    distance of the genome to the bounds.
+    """
+    clipped = np.clip(genome, lower, upper)
+    return fitness(clipped, cameraOptimizer) + BOUND_PENALTY * np.sum((genome - clipped) ** 2)
 
 
 def convertToNumpy(o):
@@ -75,32 +340,275 @@ def convertToNumpy(o):
 
 
 def optimizeAllShots(scene_snapshot):
-    def doOptimization(scene_snapshot, shot, return_queue):
-        optimizer = CameraOptimizer(scene_snapshot, shot)
-        return_queue.put(optimizer.optimize())
-
-    processes = []
-    for shot in scene_snapshot.shots:
-        q = Queue(1)
-        p = Process(target=doOptimization, args=(scene_snapshot, shot, q))
-        processes.append((p, q))
-        p.start()
-    results = []
-    for process, queue in processes:
-        results.append(queue.get())
-        process.join()
-    return results
+    """
+    Optimizes all shots of the scene_snapshot one after another in this process.
+    """
+    deadline = getDeadline(scene_snapshot)
+    terms = SceneTerms(scene_snapshot)
+    return [CameraOptimizer(scene_snapshot, shot, terms=terms).optimize(deadline) for shot in
+            scene_snapshot.shots]
+
+# =========================== Optimization cache ===============================
+# Positions (and the old camera configuration, which the fitness depends on) are
+# compared in steps of CACHE_QUANTUM. If nothing moved by a whole step the last optimum
+# of the shot is reused (if the optimizer converged). If nothing moved more than
+# WARM_START_THRESHOLD the optimization starts only from the last optimum. Optima found
+# with the old camera on the other side of the line are never used.
+CACHE_QUANTUM = 0.01
+WARM_START_THRESHOLD = 0.1
+REUSE, WARM_START = range(0, 2)
+
+
+def getScenePositions(scene_snapshot):
+    """
+    Returns the positions of the target, the linetarget and all persons (with their
+    eyes) in the scene_snapshot as one array.
+    """
+    objects = [scene_snapshot.target, scene_snapshot.linetarget]
+    for person in scene_snapshot.persons:
+        objects += [person, person.eye_L, person.eye_R]
+    return np.array([o.location for o in objects if o], dtype=np.float64)
+
+
+def getSceneSignature(scene_snapshot, shot, terms):
+    linetarget_name = scene_snapshot.linetarget.name if scene_snapshot.linetarget else None
+    line_side = terms.lineGeometry[1] if terms.lineGeometry is not None else None
+    return (shot, scene_snapshot.target.name, linetarget_name,
+            tuple([person.name for person in scene_snapshot.persons]), line_side)
+
+
+def getCacheState(scene_snapshot, terms):
+    """
+    Returns the scene positions and the old camera configuration as one flat array.
+    """
+    return np.hstack((getScenePositions(scene_snapshot).ravel(), terms.oldConfiguration))
+
+
+class OptimizationCache:
+    """
+    Remembers the last optimum of every shot together with the positions in the scene
+    it was found for. Between two frames the scene usually changes only a little, so the
+    last optimum can be reused or used as the only starting point.
+    """
+
+    def __init__(self, quantum=CACHE_QUANTUM, threshold=WARM_START_THRESHOLD):
+        self.quantum = quantum
+        self.threshold = threshold
+        self.entries = {}
+
+    def lookup(self, scene_snapshot, shot, terms):
+        """
+        Returns REUSE, WARM_START or None and the last optimum for the shot. Optima where
+        the optimizer did not converge are never reused but improved by a warm start.
+        terms are the SceneTerms of the scene_snapshot.
+        """
+        signature = getSceneSignature(scene_snapshot, shot, terms)
+        if signature not in self.entries:
+            return None, None
+        state, optimum, converged = self.entries[signature]
+        new_state = getCacheState(scene_snapshot, terms)
+        if converged and (np.round(new_state / self.quantum) ==
+                          np.round(state / self.quantum)).all():
+            return REUSE, optimum
+        if np.max(np.abs(new_state - state)) < self.threshold:
+            return WARM_START, optimum
+        return None, None
+
+    def store(self, scene_snapshot, shot, terms, optimum, converged=True):
+        self.entries[getSceneSignature(scene_snapshot, shot, terms)] = (
+            getCacheState(scene_snapshot, terms), np.array(optimum), converged)
+
+
+# =========================== Optimizer pool ===================================
+# While waiting for results the pool checks every RESULT_TIMEOUT seconds whether all
+# workers are still alive.
+RESULT_TIMEOUT = 1.0
+
+
+class OptimizationError(Exception):
+    pass
+
+
+def optimizationWorker(snapshot_queue, task_queue, result_queue, method=OPTIMIZATION_METHOD):
+    """
+    Runs in a worker process of the OptimizerPool. Tasks are tuples of a snapshot id,
+    a shot, the index of the start vector, the start vector and the deadline. The
+    snapshot with that id is taken from the snapshot_queue of this worker. Results are
+    tuples of the snapshot id, the shot, the index of the start vector and either the
+    optimum, its fitness and whether the optimizer converged or an OptimizationError
+    with the traceback if the optimization raised.
+    """
+    snapshot_id = None
+    scene_snapshot = None
+    terms = None
+    optimizers = {}
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_snapshot_id, shot, start_index, start, deadline = task
+        try:
+            while snapshot_id != task_snapshot_id:
+                snapshot_id, scene_snapshot = snapshot_queue.get()
+                terms = None
+                optimizers = {}
+                terms = SceneTerms(scene_snapshot)
+            if shot not in optimizers:
+                optimizers[shot] = CameraOptimizer(scene_snapshot, shot, method, terms)
+            result = optimizers[shot].optimizeFrom(start, deadline)
+        except Exception:
+            result = OptimizationError(traceback.format_exc())
+        # make sure the output of the optimizer is written before the result is reported
+        sys.stdout.flush()
+        result_queue.put((task_snapshot_id, shot, start_index, result))
+
+
+class OptimizerPool:
+    """
+    A fixed number of worker processes (one per core by default) which stay alive
+    between frames. For each frame the SceneSnapshot is sent to every worker once and
+    one task per shot and starting point is distributed to the workers.
+    """
+
+    def __init__(self, processes=None, cache=None, method=OPTIMIZATION_METHOD):
+        self.size = processes or cpu_count()
+        self.cache = cache
+        self.snapshot_id = 0
+        self.task_queue = Queue()
+        self.result_queue = Queue()
+        self.snapshot_queues = []
+        self.workers = []
+        for _ in range(self.size):
+            snapshot_queue = Queue()
+            worker = Process(target=optimizationWorker,
+                args=(snapshot_queue, self.task_queue, self.result_queue, method))
+            worker.daemon = True
+            worker.start()
+            self.snapshot_queues.append(snapshot_queue)
+            self.workers.append(worker)
+
+    def optimizeAllShots(self, scene_snapshot):
+        """
+        Returns a list with the best configuration, its fitness, the shot and whether
+        all optimizations of the shot converged for every shot of the scene_snapshot.
+        If the scene_snapshot has a time_budget every optimization stops at the deadline.
+        Raises an OptimizationError if an optimization raised or a worker died.
+        """
+        self.snapshot_id += 1
+        deadline = getDeadline(scene_snapshot)
+        tasks = []
+        best = {}
+        converged = dict([(shot, True) for shot in scene_snapshot.shots])
+        reused_shots = []
+        terms = SceneTerms(scene_snapshot)
+        for shot in scene_snapshot.shots:
+            optimizer = CameraOptimizer(scene_snapshot, shot, terms=terms)
+            mode, optimum = None, None
+            if self.cache and not scene_snapshot.warm_start:
+                mode, optimum = self.cache.lookup(scene_snapshot, shot, terms)
+            if mode == REUSE:
+                best[shot] = (fitness(optimum, optimizer), 0, optimum)
+                reused_shots.append(shot)
+                continue
+            elif mode == WARM_START:
+                start_vectors = [optimum]
+            else:
+                start_vectors = optimizer.getStartVectors()
+            for start_index, start in enumerate(start_vectors):
+                tasks.append((self.snapshot_id, shot, start_index, start, deadline))
+        if tasks:
+            for snapshot_queue in self.snapshot_queues:
+                snapshot_queue.put((self.snapshot_id, scene_snapshot))
+        for task in tasks:
+            self.task_queue.put(task)
+        remaining = len(tasks)
+        while remaining:
+            result_snapshot_id, shot, start_index, result = self.getResult()
+            if result_snapshot_id != self.snapshot_id:
+                # left over from a snapshot whose optimization failed
+                continue
+            remaining -= 1
+            if isinstance(result, OptimizationError):
+                raise result
+            o, f_o, task_converged = result
+            converged[shot] = converged[shot] and task_converged
+            if shot not in best or (f_o, start_index) < best[shot][:2]:
+                best[shot] = (f_o, start_index, o)
+        if self.cache and not scene_snapshot.warm_start:
+            # Reused optima keep the positions they were optimized for. Otherwise slow
+            # movements would never be noticed.
+            for shot in [s for s in scene_snapshot.shots if s not in reused_shots]:
+                self.cache.store(scene_snapshot, shot, terms, best[shot][2],
+                                 converged[shot])
+        return [(best[shot][2], best[shot][0], shot, converged[shot]) for shot in
+                scene_snapshot.shots]
+
+    def getResult(self):
+        """
+        Waits for the next result. Raises an OptimizationError if a worker died instead
+        of waiting forever.
+        """
+        while True:
+            try:
+                return self.result_queue.get(timeout=RESULT_TIMEOUT)
+            except Empty:
+                dead = [worker for worker in self.workers if not worker.is_alive()]
+                if dead:
+                    raise OptimizationError("Optimization worker died with exit code " +
+                                            str(dead[0].exitcode))
+
+    def isAlive(self):
+        return all([worker.is_alive() for worker in self.workers])
+
+    def terminate(self):
+        for worker in self.workers:
+            worker.terminate()
+            worker.join()
+
+    def close(self):
+        for _ in self.workers:
+            self.task_queue.put(None)
+        for worker in self.workers:
+            worker.join()
 
 # =============================== Main =========================================
 
 def main():
-    initial_data = pickle.load(sys.stdin)
-    results = optimizeAllShots(initial_data)
-    sys.stdout.write("OK\n")
-    sys.stdout.flush()
-    #remove all traces of numpy before pickling
-    result_list = [(r[0].tolist(), float(r[1]), int(r[2])) for r in results]
-    pickle.dump(result_list, sys.stdout)
+    """
+    Optimizes every SceneSnapshot received on stdin until stdin is closed. This way
+    the process stays alive for the whole scene. For every snapshot "OK" is written
+    after the optimization (so the output of the optimizers can be told apart from
+    the results) followed by a message with the results. Snapshots with a time_budget
+    are answered after that many seconds at the latest (plus one fitness evaluation per
+    optimization) with the best configurations found so far. If the optimization of a
+    snapshot fails the traceback is sent as an error reply (see Protocol.ERROR) and the
+    process goes on with the next snapshot.
+    """
+    in_stream, out_stream = getBinaryStreams()
+    pool = OptimizerPool(cache=OptimizationCache())
+    while True:
+        try:
+            scene_snapshot = readMessage(in_stream)
+        except EOFError:
+            break
+        try:
+            results = pool.optimizeAllShots(scene_snapshot)
+            #remove all traces of numpy before pickling
+            result_list = [(r[0].tolist(), float(r[1]), int(r[2]), bool(r[3])) for r in
+                           results]
+            error = None
+        except Exception:
+            error = traceback.format_exc()
+            if not pool.isAlive():
+                pool.terminate()
+                pool = OptimizerPool(cache=OptimizationCache())
+        sys.stdout.flush()
+        out_stream.write(b"OK\n")
+        if error is None:
+            writeMessage(out_stream, result_list)
+        else:
+            writeError(out_stream, error)
+    pool.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,106 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# =============================== Imports ======================================
+import pickle
+import struct
+import sys
+import zlib
+
+# =============================== Constants ====================================
+# Every message starts with MAGIC, the PROTOCOL_VERSION, the length of the payload and
+# its CRC32. The payload is a pickle (protocol 2 so Python 2 and 3 can read it). Text
+# printed to the stream before a message is skipped. Headers with a length above
+# MAX_MESSAGE_LENGTH are no headers, a payload with the wrong checksum is never unpickled.
+PROTOCOL_VERSION = 2
+MAGIC = b"\x00AMCMSG"
+HEADER = struct.Struct(">7sBII")
+MAX_MESSAGE_LENGTH = 64 * 1024 * 1024
+PICKLE_PROTOCOL = 2
+
+# A request is a list of commands, each a tuple of the command name and its arguments.
+# The reply is a list with one result for every command in the request.
+ENTITIES = "entities"  # () -> {"Persons": [names], "Objects": [names], "Places": [names]}
+BLOCK = "block"  # () -> {"distribution": [...], "targets": (target, linetarget), "cut": bool}
+ADVANCE = "advance"  # (frame,) -> {"new_beats": bool} updated with BLOCK if new_beats
+SCHEDULE = "schedule"  # () -> sorted list of the frames where new beats start
+DECISION = "decision"  # (shot,) -> True
+QUIT = "quit"  # () -> True
+
+# If a process can not answer a message it replies (ERROR, traceback) instead. readMessage
+# raises a RemoteError with the traceback for such a reply.
+ERROR = "error"
+
+# =============================== Methods ======================================
+class ProtocolError(Exception):
+    pass
+
+
+class RemoteError(Exception):
+    pass
+
+
+def getBinaryStreams():
+    """
+    Returns stdin and stdout of this process as binary streams.
+    """
+    return getattr(sys.stdin, "buffer", sys.stdin), getattr(sys.stdout, "buffer", sys.stdout)
+
+
+def readExactly(stream, size):
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise EOFError("The stream was closed in the middle of a message.")
+        data += chunk
+    return data
+
+
+def getChecksum(payload):
+    return zlib.crc32(payload) & 0xffffffff
+
+
+def writeMessage(stream, message):
+    payload = pickle.dumps(message, PICKLE_PROTOCOL)
+    stream.write(HEADER.pack(MAGIC, PROTOCOL_VERSION, len(payload), getChecksum(payload)) +
+                 payload)
+    stream.flush()
+
+
+def writeError(stream, text):
+    writeMessage(stream, (ERROR, text))
+
+
+def readMessage(stream):
+    """
+    Reads the next message from stream. Bytes before the MAGIC (e.g. from text
+    which was printed to the stream) are skipped. Raises a ProtocolError if the
+    version or the checksum of the message is wrong and a RemoteError if the message
+    is an error reply.
+    """
+    header = readExactly(stream, HEADER.size)
+    while header[:len(MAGIC)] != MAGIC or HEADER.unpack(header)[2] > MAX_MESSAGE_LENGTH:
+        header = header[1:] + readExactly(stream, 1)
+    _, version, length, checksum = HEADER.unpack(header)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError("Protocol version " + str(version) + " is not supported. " +
+                            "Expected version " + str(PROTOCOL_VERSION) + ".")
+    payload = readExactly(stream, length)
+    if getChecksum(payload) != checksum:
+        raise ProtocolError("The checksum of the message is wrong.")
+    if sys.version_info[0] >= 3:
+        message = pickle.loads(payload, encoding="utf-8")
+    else:
+        message = pickle.loads(payload)
+    if isinstance(message, tuple) and len(message) == 2 and message[0] == ERROR:
+        raise RemoteError(message[1])
+    return message
+
+
+def request(inStream, outStream, commands):
+    """
+    Sends the list of commands in one message and returns the list of results.
+    """
+    writeMessage(outStream, commands)
+    return readMessage(inStream)
@@ -36,7 +36,8 @@ class Camera(object):
 
 
 class SceneSnapshot(object):
-    def __init__(self, target, linetarget, camera, persons, objects, places, shots):
+    def __init__(self, target, linetarget, camera, persons, objects, places, shots,
+                 time_budget=None, warm_start=False):
         self.target = target
         self.linetarget = linetarget
         self.camera = camera
@@ -44,6 +45,10 @@ class SceneSnapshot(object):
         self.objects = objects
         self.places = places
         self.shots = shots
+        # seconds the PositionProcess may spend on this snapshot (None: until converged)
+        self.time_budget = time_budget
+        # optimize only from the configuration of the camera (to follow its optimum)
+        self.warm_start = warm_start
 
 class Place(object):
     def __init__(self, name, location):
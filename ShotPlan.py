@@ -0,0 +1,75 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# =============================== Imports ======================================
+from Config import DELIMITER, SHOT_NAMES
+
+# =============================== Shot plan ====================================
+class PlanEntry:
+    """
+    From frame on the camera shows shot of target (with the line to linetarget). If cut
+    is set the camera cuts at this frame, otherwise it moves on continuously.
+    """
+
+    def __init__(self, frame, shot, target, linetarget, cut):
+        self.frame = frame
+        self.shot = shot
+        self.target = target
+        self.linetarget = linetarget
+        self.cut = cut
+
+    def __repr__(self):
+        return "PlanEntry(%d, %s, %s, %s, %s)" % (
+            self.frame, SHOT_NAMES[self.shot], self.target, self.linetarget, self.cut)
+
+
+def savePlan(filename, plan):
+    """
+    Writes the plan as one line per entry: frame, shot name, target, linetarget and
+    cut (1 or 0).
+    """
+    with open(filename, "w") as f:
+        for entry in plan:
+            f.write(DELIMITER.join([str(entry.frame), SHOT_NAMES[entry.shot], entry.target,
+                                    entry.linetarget, str(int(entry.cut))]) + "\n")
+
+
+def loadPlan(filename):
+    plan = []
+    with open(filename, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            frame, shot, target, linetarget, cut = line.split(DELIMITER)
+            plan.append(PlanEntry(int(frame), SHOT_NAMES.index(shot), target, linetarget,
+                bool(int(cut))))
+    return sorted(plan, key=lambda entry: entry.frame)
+
+
+def getSegments(plan, last_frame):
+    """
+    Splits the plan at the cuts. Returns a list of (first_frame, last_frame, entries)
+    where entries are the plan entries of the segment. The first entry of the plan
+    always starts a segment.
+    """
+    segments = []
+    for i, entry in enumerate(plan):
+        if i == 0 or entry.cut:
+            segments.append([entry.frame, last_frame, [entry]])
+            if len(segments) > 1:
+                segments[-2][1] = entry.frame - 1
+        else:
+            segments[-1][2].append(entry)
+    return [tuple(segment) for segment in segments]
+
+
+def getEntryForFrame(entries, frame):
+    """
+    Returns the last entry which starts at or before frame.
+    """
+    current = entries[0]
+    for entry in entries:
+        if entry.frame <= frame:
+            current = entry
+    return current
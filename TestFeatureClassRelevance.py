@@ -9,32 +9,32 @@ from sklearn import preprocessing
 from Classify import getDataMatrix
 from Config import TRAIN_FILES
 from XValidation import ParallelXValidation
-from Features import getAllFeatureClasses
+from Features import ALL_FEATURES
 from TuneParametersWithOptimizer import tuneParametersForSVM
 
 def TestFeatureClassRelevance(number = None):
     files = TRAIN_FILES
-    feature_Classes = getAllFeatureClasses()
+    feature_names = ALL_FEATURES
     results = []
     if number:
-        reference_data, _ = getDataMatrix(files, leave_out_class=feature_Classes[number])
+        reference_data, _ = getDataMatrix(files, leave_out_class=feature_names[number])
         scaler = preprocessing.Scaler()
         scaler.fit(reference_data)
-        optimized_parameters = tuneParametersForSVM(files, scaler, reference_data, True, leave_out_class=feature_Classes[number])
+        optimized_parameters = tuneParametersForSVM(files, scaler, reference_data, True, leave_out_class=feature_names[number])
         #optimized_parameters = (1910.41398886, 9.88131291682e-324)
-        results.append((feature_Classes[number], ParallelXValidation(files, scaler, True,
+        results.append((feature_names[number], ParallelXValidation(files, scaler, True,
             C=max(0.0,optimized_parameters[0]),
-            gamma=max(1e-323,optimized_parameters[1]), leave_out_class=feature_Classes[number])))
+            gamma=max(1e-323,optimized_parameters[1]), leave_out_class=feature_names[number])))
     else:
-        for number in range(len(feature_Classes))[3:]:
-            reference_data, _ = getDataMatrix(files, leave_out_class=feature_Classes[number])
+        for number in range(len(feature_names))[3:]:
+            reference_data, _ = getDataMatrix(files, leave_out_class=feature_names[number])
             scaler = preprocessing.Scaler()
             scaler.fit(reference_data)
-            results.append((feature_Classes[number], ParallelXValidation(files, scaler, True, leave_out_class=feature_Classes[number])))
-    for result_class, result in results:
-        print(str(result_class).split(".")[1]+":"+"\t".join(["" for _ in range(int(round((50-len(str(result_class).split(".")[1]))/8.0)))])+str(result))
+            results.append((feature_names[number], ParallelXValidation(files, scaler, True, leave_out_class=feature_names[number])))
+    for result_name, result in results:
+        print(result_name+":"+"\t".join(["" for _ in range(int(round((50-len(result_name))/8.0)))])+str(result))
         os.system("wget http://www.pinae.net/automoculus/getText.php?text=FeatureClass_is_" +
-                  str(result_class).split(".")[1] + "_Result_is_" + str(result))
+                  result_name + "_Result_is_" + str(result))
         os.system("rm getText*")
 
 if __name__ == "__main__":
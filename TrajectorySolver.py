@@ -0,0 +1,250 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# =============================== Imports ======================================
+from multiprocessing import Process, Queue, cpu_count
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+import sys
+import time
+import traceback
+
+import numpy as np
+import scipy.optimize as opt
+from scipy import interpolate
+
+from BakedScene import loadBakedScene
+from FitnessFunction import fitnessAndGradient
+from PositionProcess import CameraOptimizer, LBFGSB
+from ShotPlan import loadPlan, getSegments, getEntryForFrame
+
+# =============================== Constants ====================================
+# The camera path is optimized at every KEYFRAME_STEP-th frame of a segment (and its
+# last frame). The frames in between are interpolated with a cubic spline.
+KEYFRAME_STEP = 4
+# Weight of the squared acceleration of the camera between the keyframes.
+SMOOTHNESS = 2000.0
+# Tolerance of the optimization of the whole path (see scipy.optimize.fmin_l_bfgs_b).
+FACTR = 1e11
+# While waiting for the segments solveTrajectory checks every RESULT_TIMEOUT seconds
+# whether a worker died.
+RESULT_TIMEOUT = 1.0
+
+# =========================== Segment problem ==================================
+class SegmentProblem:
+    """
+    The camera path of one segment (the frames from one cut to the next) as one
+    optimization problem: the sum of the fitness at every keyframe plus SMOOTHNESS times
+    the squared acceleration of the camera. The configuration at the cut (start) is used
+    as the old configuration of every keyframe so the camera stays on its side of the
+    line.
+    """
+
+    def __init__(self, baked, first_frame, last_frame, entries, start,
+                 step=KEYFRAME_STEP, smoothness=SMOOTHNESS):
+        self.first_frame = first_frame
+        self.last_frame = last_frame
+        self.keyframes = list(range(first_frame, last_frame + 1, step))
+        if self.keyframes[-1] != last_frame:
+            self.keyframes.append(last_frame)
+        self.start = np.array(start, dtype=np.float64)
+        self.smoothness = smoothness
+        self.optimizers = []
+        for frame in self.keyframes:
+            entry = getEntryForFrame(entries, frame)
+            snapshot = baked.createSnapshot(frame, entry.target, entry.linetarget,
+                [entry.shot], self.start)
+            self.optimizers.append(CameraOptimizer(snapshot, entry.shot, LBFGSB))
+
+    def objective(self, x):
+        path = x.reshape((len(self.keyframes), 5))
+        value = 0.0
+        gradient = np.zeros(path.shape)
+        for i, optimizer in enumerate(self.optimizers):
+            f, g = fitnessAndGradient(path[i], optimizer)
+            value += f
+            gradient[i] = g
+        acceleration = path[2:] - 2 * path[1:-1] + path[:-2]
+        value += self.smoothness * np.sum(acceleration ** 2)
+        gradient[2:] += 2 * self.smoothness * acceleration
+        gradient[1:-1] -= 4 * self.smoothness * acceleration
+        gradient[:-2] += 2 * self.smoothness * acceleration
+        return value, gradient.ravel()
+
+    def getInitialPath(self):
+        """
+        Optimizes every keyframe on its own, starting from the optimum of the keyframe
+        before (and the start configuration for the first one).
+        """
+        path = []
+        configuration = self.start
+        for optimizer in self.optimizers:
+            configuration = optimizer.optimizeFrom(configuration)[0]
+            path.append(configuration)
+        return np.array(path)
+
+    def solve(self):
+        """
+        Returns the frames of the segment and the interpolated camera configuration for
+        every frame.
+        """
+        bounds = []
+        for optimizer in self.optimizers:
+            bounds += optimizer.getBounds()
+        x, _, _ = opt.fmin_l_bfgs_b(func=self.objective, x0=self.getInitialPath().ravel(),
+            bounds=bounds, factr=FACTR)
+        path = x.reshape((len(self.keyframes), 5))
+        frames = np.arange(self.first_frame, self.last_frame + 1)
+        return frames, interpolatePath(self.keyframes, path, frames)
+
+
+def interpolatePath(keyframes, path, frames):
+    """
+    Interpolates every dimension of the path (one row per keyframe) with a cubic spline
+    (or linearly if there are less than four keyframes).
+    """
+    if len(keyframes) == 1:
+        return np.tile(path[0], (len(frames), 1))
+    degree = 3 if len(keyframes) >= 4 else 1
+    return np.column_stack([interpolate.splev(frames, interpolate.splrep(keyframes,
+        path[:, i], k=degree, s=0)) for i in range(path.shape[1])])
+
+# =============================== Solver =======================================
+def getStartConfigurations(baked, segments):
+    """
+    Optimizes the first frame of every segment one after another. The start of each
+    segment is the old configuration for the next one, beginning with the camera of the
+    baked scene.
+    """
+    configuration = baked.getInitialConfiguration()
+    starts = []
+    for first_frame, _, entries in segments:
+        entry = entries[0]
+        snapshot = baked.createSnapshot(first_frame, entry.target, entry.linetarget,
+            [entry.shot], configuration)
+        configuration = CameraOptimizer(snapshot, entry.shot, LBFGSB).optimize()[0]
+        starts.append(configuration)
+    return starts
+
+
+class TrajectoryError(Exception):
+    pass
+
+
+def segmentWorker(baked, task_queue, result_queue):
+    """
+    Solves segments until it gets None. Results are tuples of the index of the segment,
+    its frames and its path. If solving a segment raises, the result is the index and
+    a TrajectoryError with the traceback.
+    """
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        index, first_frame, last_frame, entries, start = task
+        try:
+            result = SegmentProblem(baked, first_frame, last_frame, entries, start).solve()
+        except Exception:
+            result = TrajectoryError(traceback.format_exc())
+        # make sure the output of the optimizer is written before the result is reported
+        sys.stdout.flush()
+        if isinstance(result, TrajectoryError):
+            result_queue.put((index, result))
+        else:
+            result_queue.put((index,) + tuple(result))
+
+
+def getSegmentResult(result_queue, workers):
+    """
+    Waits for the next result of the segmentWorkers and raises a TrajectoryError if a
+    segment failed or a worker died.
+    """
+    while True:
+        try:
+            result = result_queue.get(timeout=RESULT_TIMEOUT)
+        except Empty:
+            dead = [worker for worker in workers if worker.exitcode not in (None, 0)]
+            if dead:
+                raise TrajectoryError("Segment worker died with exit code " +
+                                      str(dead[0].exitcode))
+            continue
+        if isinstance(result[1], TrajectoryError):
+            raise result[1]
+        return result
+
+
+def solveTrajectory(baked, plan, processes=None):
+    """
+    Returns the frames from the first entry of the plan to the end of the baked scene
+    and the camera configuration for every one of them. The segments between the cuts
+    are solved in parallel by processes worker processes (one per core by default).
+    Raises a TrajectoryError if a segment could not be solved.
+    """
+    segments = getSegments(plan, baked.getLastFrame())
+    starts = getStartConfigurations(baked, segments)
+    task_queue = Queue()
+    result_queue = Queue()
+    for index, (first_frame, last_frame, entries) in enumerate(segments):
+        task_queue.put((index, first_frame, last_frame, entries, starts[index]))
+    workers = []
+    for _ in range(min(processes or cpu_count(), len(segments))):
+        task_queue.put(None)
+        worker = Process(target=segmentWorker, args=(baked, task_queue, result_queue))
+        worker.start()
+        workers.append(worker)
+    try:
+        results = sorted([getSegmentResult(result_queue, workers) for _ in segments],
+            key=lambda result: result[0])
+    except TrajectoryError:
+        for worker in workers:
+            worker.terminate()
+        raise
+    finally:
+        for worker in workers:
+            worker.join()
+    return (np.hstack([frames for _, frames, _ in results]),
+            np.vstack([path for _, _, path in results]))
+
+
+def getFocusDistances(baked, plan, frames, configurations):
+    """
+    Returns the distance between the camera and its target for every frame.
+    """
+    distances = []
+    for frame, configuration in zip(frames, configurations):
+        target = getEntryForFrame(plan, frame).target
+        distances.append(np.sqrt(np.sum((baked.getLocation(target, frame) -
+                                         configuration[:3]) ** 2)))
+    return np.array(distances)
+
+
+def saveTrajectory(filename, frames, configurations, focus_distances):
+    np.savez(filename, frames=frames, configurations=configurations,
+        focus_distances=focus_distances)
+
+
+def loadTrajectory(filename):
+    data = np.load(filename)
+    return data["frames"], data["configurations"], data["focus_distances"]
+
+# =============================== Main =========================================
+def main():
+    """
+    Usage: TrajectorySolver.py <baked scene> <shot plan> <trajectory file>
+    """
+    if len(sys.argv) != 4:
+        print(main.__doc__.strip())
+        sys.exit(1)
+    start = time.time()
+    baked = loadBakedScene(sys.argv[1])
+    plan = loadPlan(sys.argv[2])
+    frames, configurations = solveTrajectory(baked, plan)
+    saveTrajectory(sys.argv[3], frames, configurations,
+        getFocusDistances(baked, plan, frames, configurations))
+    print("Solved %d frames in %.1f seconds." % (len(frames), time.time() - start))
+
+
+if __name__ == "__main__":
+    main()
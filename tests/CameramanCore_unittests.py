@@ -0,0 +1,159 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# =============================== Imports ======================================
+from __future__ import division
+import subprocess
+import sys
+
+sys.path.append("..")
+
+import unittest
+import numpy as np
+
+from BakedScene import createTestBakedScene
+from CameramanCore import Cameraman, BakedSceneAdapter, ReplayClassifier, getEntities
+from CameramanCore import makeCompatible, updateKeyframes, KeyframeBuffer, CAMERA_DATA
+from CameramanCore import interpolateConfigurations, PositionProcessOptimizer
+from CameramanCore import LOCATION_TOLERANCE
+from Config import MEDIUM_SHOT, CLOSEUP
+from ShotPlan import PlanEntry
+
+# =============================== Helpers ======================================
+class StubOptimizer:
+    """
+    Places the camera in front of the target, the further away the wider the shot.
+    """
+
+    def __init__(self):
+        self.snapshots = []
+
+    def __call__(self, scene_snapshot):
+        self.snapshots.append(scene_snapshot)
+        location = np.array(scene_snapshot.target.location)
+        return [(np.hstack((location + [0, -2 - shot, 1.5], [np.pi / 2, 0])), 1.0, shot, True)
+                for shot in scene_snapshot.shots]
+
+class DyingOptimizer(PositionProcessOptimizer):
+    """
+    A PositionProcessOptimizer whose process exits after reading the first line.
+    """
+
+    def __init__(self):
+        self.starts = 0
+        PositionProcessOptimizer.__init__(self)
+
+    def startPositionProcess(self):
+        self.starts += 1
+        return subprocess.Popen([sys.executable, "-c", "import sys; sys.stdin.readline()"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+# ================================ Tests =======================================
+class TestCameramanCore(unittest.TestCase):
+    def setUp(self):
+        self.baked = createTestBakedScene(61, 0, (5, -8, 1))
+        self.plan = [PlanEntry(1, MEDIUM_SHOT, "Max", "Agnes", True),
+                     PlanEntry(30, CLOSEUP, "Agnes", "Max", True)]
+
+    def test_makeCompatible(self):
+        configuration = makeCompatible([0, 0, 0, 2 * np.pi + 0.1, -0.1],
+            np.array([0, 0, 0, 0, 4 * np.pi]))
+        self.assertAlmostEqual(configuration[3], 0.1)
+        self.assertAlmostEqual(configuration[4], 4 * np.pi - 0.1)
+
+    def test_interpolateConfigurations(self):
+        frames = [1, 5, 9, 20]
+        configurations = np.array([[f, 2 * f, 0, 0.1 * f, 1] for f in frames])
+        interpolated = interpolateConfigurations(frames, configurations, range(1, 21))
+        self.assertTrue(np.allclose(interpolated[[0, 4, 8, 19]], configurations))
+        # linear movements stay linear
+        self.assertTrue(np.allclose(interpolated[:, 0], np.arange(1, 21)))
+        self.assertTrue(np.allclose(interpolated[:, 4], 1))
+
+    def test_keyframes(self):
+        keyframes = KeyframeBuffer()
+        keyframes.add(3, [1, 2, 3, 0.5, 0.25], 4.0)
+        keyframes.add(1, [0, 0, 0, 0, 0], 1.0)
+        keyframes.add(3, [1, 2, 3, 0.5, 0.75], 5.0)
+        channels = keyframes.getChannels()
+        self.assertEqual([(c[1], c[2]) for c in channels],
+            [("location", 0), ("location", 1), ("location", 2), ("rotation_euler", 0),
+             ("rotation_euler", 1), ("rotation_euler", 2), ("dof_distance", 0)])
+        self.assertEqual(list(channels[2][3]), [1, 0, 3, 3])
+        self.assertEqual(list(channels[5][3]), [1, 0, 3, 0.75])
+        self.assertEqual(channels[6][0], CAMERA_DATA)
+        self.assertEqual(list(channels[6][3]), [1, 1, 3, 5])
+        updated, new = updateKeyframes([9, 7, 3, 7, 0, 7], channels[6][3])
+        self.assertEqual(list(updated), [9, 7, 3, 5, 0, 7])
+        self.assertEqual(list(new), [1, 1])
+
+    def test_positionProcessDies(self):
+        # a dying PositionProcess is restarted once and then reported instead of a hang
+        optimizer = DyingOptimizer()
+        snapshot = self.baked.createSnapshot(1, "Max", "Agnes", [MEDIUM_SHOT],
+            self.baked.getInitialConfiguration())
+        self.assertRaises(EOFError, optimizer, snapshot)
+        self.assertEqual(optimizer.starts, 2)
+        optimizer.close()
+
+    def test_replay(self):
+        adapter = BakedSceneAdapter(self.baked)
+        optimizer = StubOptimizer()
+        cameraman = Cameraman(adapter, ReplayClassifier(getEntities(self.baked), self.plan),
+            optimizer)
+        plan = cameraman.run()
+        self.assertEqual([(e.frame, e.shot, e.target, e.cut) for e in plan],
+            [(e.frame, e.shot, e.target, e.cut) for e in self.plan])
+        self.assertEqual(adapter.keyframes.getFrames(), list(range(1, 61)))
+        self.assertEqual(len(optimizer.snapshots), 60)
+        # the cuts jump to the optimum, in between the camera follows it smoothly
+        for frame in [1, 30]:
+            entry = [e for e in self.plan if e.frame == frame][0]
+            optimum = self.baked.getLocation(entry.target, frame) + [0, -2 - entry.shot, 1.5]
+            self.assertTrue(np.allclose(adapter.keyframes[frame][0][:3], optimum))
+        steps = [np.linalg.norm(adapter.keyframes[f + 1][0][:3] - adapter.keyframes[f][0][:3])
+                 for f in range(1, 60) if f != 29]
+        self.assertTrue(max(steps) < 0.1)
+        configuration, focus_distance = adapter.keyframes[10]
+        self.assertAlmostEqual(focus_distance, np.linalg.norm(
+            self.baked.getLocation("Max", 10) - configuration[:3]))
+
+    def test_pipelined(self):
+        # blocks which start less than MIN_SHOT_LENGTH frames after a cut are merged
+        plan = [PlanEntry(1, MEDIUM_SHOT, "Max", "Agnes", True),
+                PlanEntry(10, CLOSEUP, "Agnes", "Max", False),
+                PlanEntry(30, MEDIUM_SHOT, "Agnes", "Max", True),
+                PlanEntry(35, CLOSEUP, "Max", "Agnes", True),
+                PlanEntry(58, MEDIUM_SHOT, "Max", "Agnes", False)]
+        runs = []
+        for pipelined in [False, True]:
+            adapter = BakedSceneAdapter(self.baked)
+            cameraman = Cameraman(adapter, ReplayClassifier(getEntities(self.baked), plan),
+                StubOptimizer(), pipelined=pipelined)
+            runs.append(([(e.frame, e.shot, e.target, e.cut) for e in cameraman.run()],
+                         adapter.keyframes))
+        self.assertEqual(runs[0][0], runs[1][0])
+        self.assertEqual([e[0] for e in runs[1][0]], [1, 20, 39, 58])
+        for frame in range(1, 61):
+            self.assertTrue(np.allclose(runs[0][1][frame][0], runs[1][1][frame][0]))
+
+    def test_adaptive(self):
+        runs = []
+        for adaptive in [False, True]:
+            adapter = BakedSceneAdapter(self.baked)
+            optimizer = StubOptimizer()
+            cameraman = Cameraman(adapter, ReplayClassifier(getEntities(self.baked),
+                self.plan), optimizer, adaptive=adaptive)
+            runs.append(([(e.frame, e.shot, e.target, e.cut) for e in cameraman.run()],
+                         adapter.keyframes, len(optimizer.snapshots)))
+        self.assertEqual(runs[0][0], runs[1][0])
+        self.assertEqual(runs[0][2], 60)
+        self.assertTrue(runs[1][2] <= 12)
+        # Agnes sways, so the interpolated keyframes are only close to the sampled ones
+        for frame in range(1, 61):
+            self.assertTrue(np.allclose(runs[0][1][frame][0], runs[1][1][frame][0],
+                atol=LOCATION_TOLERANCE))
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestCameramanCore)
+unittest.TextTestRunner(verbosity=2).run(suite)
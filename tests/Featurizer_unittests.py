@@ -7,10 +7,12 @@ import sys
 sys.path.append("..")
 
 import unittest
+import numpy as np
 
 import Beatscript
 import Config
 import ConvertData
+import Features
 
 
 # ================================ Tests =======================================
@@ -57,6 +59,77 @@ class TestConvertDataFunctions(unittest.TestCase):
         self.assertTrue(context["Entities"]["Room"].type == Config.PLACE)
         self.assertTrue(context["Entities"]["Hugos Thing"].type == Config.OBJECT)
 
+    def test_incrementalBeatList(self):
+        context = ConvertData.createContext()
+        beats = [Beatscript.Beat("1_1\tfull_shot\tfalse\tintroduce\tperson§Hugo", context),
+                 Beatscript.Beat("1_2\tfull_shot\tfalse\tsays\tperson§Hugo\tHallo", context),
+                 Beatscript.Beat("2_3\tcloseup\tfalse\texpresses\tperson§Karl", context),
+                 Beatscript.Beat("3_4\tcloseup\tfalse\tsays\tperson§Karl\tNa", context)]
+        blockList = Beatscript.coalesceBeats(beats)
+        for block in blockList:
+            Features.createBeatList(context, block)
+            Features.createBeatList(context, block)
+            expected = [b for bygone in context["BygoneBlocks"] for b in bygone] + block
+            self.assertEqual(context["BeatList"], expected)
+            context["BygoneBlocks"].append(block)
+        context["BygoneBlocks"] = blockList[:1]
+        Features.createBeatList(context, blockList[1])
+        self.assertEqual(context["BeatList"], blockList[0] + blockList[1])
+
+    def test_featurePlan(self):
+        plan = Features.getFeaturePlan()
+        self.assertTrue(Features.getFeaturePlan() is plan)
+        self.assertEqual(plan.names, Features.ACTIVE_FEATURES)
+        offset = 0
+        for name in plan.names:
+            self.assertEqual(plan.getColumns(name).start, offset)
+            offset = plan.getColumns(name).stop
+        self.assertEqual(offset, plan.width)
+        reduced = Features.getFeaturePlan(leave_out=Features.X_DecidedShots)
+        self.assertFalse("X_DecidedShots" in reduced.names)
+        self.assertEqual(reduced.width, plan.width - plan.widths["X_DecidedShots"])
+        self.assertEqual(len(Features.getAllFeatureClasses()), len(Features.ALL_FEATURES))
+
+    def test_featureMatrix(self):
+        beatscript = Config.TRAIN_FILES[0]
+        for shot in [True, False]:
+            lines = ConvertData.getFeatureLinesFromFile(beatscript, shot)
+            matrix, classes = ConvertData.getFeatureMatrixFromFile(beatscript, shot)
+            self.assertEqual(matrix.shape, (len(lines), len(lines[0]) - 1))
+            for i, line in enumerate(lines):
+                self.assertEqual(matrix[i].tolist(), line[:-1])
+                if shot:
+                    self.assertEqual(classes[i], Config.SHOT_NAMES.index(line[-1]))
+                else:
+                    self.assertEqual(classes[i], int(line[-1] == "True"))
+
+    def test_featureWidth(self):
+        # a feature which calculates fewer numbers than its width is an error
+        context, beatList = Beatscript.getContextAndBeatListFromFile(Config.TRAIN_FILES[0])
+        block = Beatscript.coalesceBeats(beatList)[0]
+        Features.initializeContextVars(context)
+        context = Features.createBeatList(context, block)
+        plan = Features.FeaturePlan(Features.ACTIVE_FEATURES)
+        row = np.zeros(plan.width)
+        plan.writeNumbers(context, block, row)
+        featureClass = plan.featureClasses[-1]
+
+        class ShortFeature(featureClass):
+            def getNumbers(self):
+                return featureClass.getNumbers(self)[:-1]
+
+        plan.featureClasses[-1] = ShortFeature
+        self.assertRaises(ValueError, plan.writeNumbers, context, block, row)
+
+    def test_frameIndex(self):
+        context, beatList = Beatscript.getContextAndBeatListFromFile(Config.TRAIN_FILES[0])
+        index = Beatscript.FrameIndex(beatList)
+        self.assertEqual(index.getBlockStartFrames(),
+                         sorted(set([beat.shotId for beat in beatList if beat.shotId > 0])))
+        for start_frame, end_frame in [(-1, 0), (0, 5), (3, 40), (17, 17), (40, 10000)]:
+            self.assertEqual(index.getBeatsBetweenFrames(start_frame, end_frame),
+                Beatscript.getBeatsBetweenFrames(beatList, start_frame, end_frame))
+
 suite = unittest.TestLoader().loadTestsFromTestCase(TestConvertDataFunctions)
 unittest.TextTestRunner(verbosity=2).run(suite)
 
@@ -4,6 +4,8 @@
 # =============================== Imports ======================================
 from __future__ import division
 import sys
+import time
+from multiprocessing import Queue
 
 sys.path.append("..")
 
@@ -15,6 +17,26 @@ import PositionProcess
 from SceneSnapshot import SceneSnapshot, Camera, Person, Object
 # ================================ Tests =======================================
 class TestPositionProcessFunctions(unittest.TestCase):
+    def setUp(self):
+        # Max talks to Agnes, the camera looks at them from the front or from the side
+        self.max = Person('Max Mustermann', np.array([0, 0, 0]), 1.8,
+            np.array([0.1, -0.05, 1.7]), np.array([0.1, 0.05, 1.7]))
+        self.agnes = Person('Agnes Angeschaute', np.array([2, 0, 0]), 1.7,
+            np.array([1.9, -0.05, 1.6]), np.array([1.9, 0.05, 1.6]))
+        self.camera = self.createCamera([1, -5, 1], [np.pi / 2, 0, 0])
+        self.sideCamera = self.createCamera([5, 0, 1], [np.pi / 2, 0, np.pi / 2])
+
+    def createCamera(self, location, rotation):
+        return Camera(0.48271098732948303, 1920, 1080, location, rotation)
+
+    def createSnapshot(self, shots, camera=None, others=(), objects=(), warm_start=False):
+        """
+        Returns a SceneSnapshot with Max as target, Agnes as linetarget and the others.
+        """
+        return SceneSnapshot(self.max, self.agnes, camera or self.camera,
+            [self.max, self.agnes] + list(others), list(objects), [], shots,
+            warm_start=warm_start)
+
     def test_angle(self):
         v1 = np.array([1, 0, 0])
         v1.reshape(-1, 1)
@@ -125,6 +147,195 @@ class TestPositionProcessFunctions(unittest.TestCase):
         self.assertAlmostEqual(x, 3, 5)
         self.assertAlmostEqual(y, 0, 5)
 
+    def test_batchFitness(self):
+        other = Person('Otto Observer', np.array([1, 2, 0]), 1.75,
+            np.array([1, 1.9, 1.65]), np.array([1.1, 1.9, 1.65]))
+        table = Object('Table', np.array([1, -1, 0.8]))
+        snapshot = self.createSnapshot([2], self.sideCamera, [other], [table])
+        random_state = np.random.RandomState(42)
+        genomes = np.column_stack((random_state.uniform(-8, 8, (200, 3)),
+                                   random_state.uniform(-np.pi, np.pi, (200, 2))))
+        genomes[0, :3] = [0, 0, 0]
+        genomes[1, :3] = [1, -1, 0.8]
+        genomes[2] = [5, 0, 1, np.pi / 2, np.pi / 2]
+        for shot in range(7):
+            optimizer = PositionProcess.CameraOptimizer(snapshot, shot)
+            batch = FitnessFunction.batchFitness(genomes, optimizer)
+            self.assertEqual(batch.shape, (len(genomes),))
+            for i, genome in enumerate(genomes):
+                single = FitnessFunction.fitness(genome, optimizer)
+                self.assertTrue(np.allclose(batch[i], single, rtol=1e-9, atol=1e-9))
+
+    def test_fitnessGradient(self):
+        table = Object('Table', np.array([1, -1, 0.8]))
+        snapshot = self.createSnapshot([2], self.sideCamera, objects=[table])
+        random_state = np.random.RandomState(42)
+        genomes = np.column_stack((random_state.uniform(-6, 6, (20, 3)),
+                                   random_state.uniform(0.3, 2.8, (20, 1)),
+                                   random_state.uniform(-3, 3, (20, 1))))
+        h = 1e-6
+        for shot in range(7):
+            optimizer = PositionProcess.CameraOptimizer(snapshot, shot)
+            for genome in genomes:
+                f, gradient = FitnessFunction.fitnessAndGradient(genome, optimizer)
+                self.assertAlmostEqual(f, FitnessFunction.fitness(genome, optimizer), 6)
+                numeric = np.array([(FitnessFunction.fitness(genome + h * d, optimizer) -
+                                     FitnessFunction.fitness(genome - h * d, optimizer)) / (2 * h)
+                                    for d in np.eye(5)])
+                self.assertTrue(np.allclose(gradient, numeric, rtol=1e-4, atol=1e-3 * max(1, f)))
+
+    def test_seedVectors(self):
+        t = self.max
+        snapshot = self.createSnapshot([2])
+        for shot in range(7):
+            optimizer = PositionProcess.CameraOptimizer(snapshot, shot)
+            minDist, maxDist, lowest, highest = optimizer.getSearchRegion()
+            seeds = optimizer.getSeedVectors(3)
+            self.assertEqual(len(seeds), 3)
+            for seed in seeds:
+                dist = np.sqrt(np.sum((seed[:3] - t.location) ** 2))
+                self.assertTrue(minDist <= dist <= maxDist)
+                self.assertTrue(lowest <= seed[2] <= highest)
+                # same side of the line as the old camera
+                self.assertTrue(seed[1] < 0)
+                xa, ya = FitnessFunction.getImageAngles(seed, t)
+                self.assertAlmostEqual(xa, 0, 5)
+                self.assertAlmostEqual(ya, 0, 5)
+                for i, (low, high) in enumerate(optimizer.getBounds()):
+                    self.assertTrue(low <= seed[i] <= high)
+            # the seeds replace the start between target and linetarget
+            self.assertEqual(len(optimizer.getStartVectors(False)),
+                1 + PositionProcess.SEED_COUNTS[shot])
+
+    def test_boundedPowell(self):
+        snapshot = self.createSnapshot([1])
+        optimizer = PositionProcess.CameraOptimizer(snapshot, 1, PositionProcess.POWELL)
+        # the start is far outside the search region of the closeup
+        o, f_o, converged = optimizer.optimizeFrom(np.array([30, -30, 10, np.pi / 2, 0]))
+        for i, (low, high) in enumerate(optimizer.getBounds()):
+            self.assertTrue(low <= o[i] <= high)
+        self.assertAlmostEqual(f_o, FitnessFunction.fitness(o, optimizer))
+
+    def test_warmStart(self):
+        snapshot = self.createSnapshot([2], warm_start=True)
+        start_vectors = PositionProcess.CameraOptimizer(snapshot, 2).getStartVectors()
+        self.assertEqual(len(start_vectors), 1)
+        self.assertTrue(np.allclose(start_vectors[0], [1, -5, 1, np.pi / 2, 0]))
+
+    def test_occluderCulling(self):
+        # The culled Occluders must match the unculled sum over all objects and other
+        # persons for every camera in the search region of every shot. Each culled
+        # occluder contributes less than occultationWeight(OCCULTATION_CUTOFF) there.
+        random_state = np.random.RandomState(1)
+        persons = [self.max, self.agnes]
+        for i, (x, y) in enumerate(random_state.uniform(-30, 30, (20, 2))):
+            persons.append(Person('Person' + str(i), np.array([x, y, 0]), 1.75,
+                np.array([x, y - 0.05, 1.65]), np.array([x, y + 0.05, 1.65])))
+        objects = [Object('Object' + str(i), np.array([x, y, 0.8])) for i, (x, y) in
+                   enumerate(random_state.uniform(-10, 10, (20, 2)))]
+        for shot in range(7):
+            snapshot = self.createSnapshot([shot], others=persons[2:], objects=objects)
+            optimizer = PositionProcess.CameraOptimizer(snapshot, shot)
+            minDist, maxDist, lowest, highest = optimizer.getSearchRegion()
+            radius = np.sqrt(random_state.uniform(minDist ** 2, maxDist ** 2, 50))
+            phi = random_state.uniform(-np.pi, np.pi, 50)
+            positions = np.column_stack((radius * np.cos(phi), radius * np.sin(phi),
+                                         random_state.uniform(lowest, highest, 50)))
+            for person in persons:
+                for part in [person, person.eye_L, person.eye_R]:
+                    others = objects + [p for p in persons if not p is part]
+                    tolerance = len(others) * FitnessFunction.occultationWeight(
+                        FitnessFunction.OCCULTATION_CUTOFF) + 1e-9
+                    occluders = optimizer.occluders[part.name]
+                    batch = occluders.getBatchOccultation(positions)
+                    for i, position in enumerate(positions):
+                        genome = np.hstack((position, [np.pi / 2, 0]))
+                        unculled = sum([FitnessFunction.occultationWeight(
+                            FitnessFunction.getVisibilityFactor(genome, part, o))
+                                        for o in others])
+                        self.assertAlmostEqual(occluders.getOccultation(position), unculled,
+                            delta=tolerance)
+                        self.assertAlmostEqual(batch[i], unculled, delta=tolerance)
+
+    def test_globalSearch(self):
+        snapshot = self.createSnapshot([2])
+        for shot in range(7):
+            optimizer = PositionProcess.CameraOptimizer(snapshot, shot)
+            starts = optimizer.globalSearch(population_size=100, generations=4, count=2)
+            self.assertTrue(1 <= len(starts) <= 2)
+            if len(starts) == 2:
+                self.assertTrue(np.sqrt(np.sum((starts[0][:3] - starts[1][:3]) ** 2)) >
+                                self.max.height)
+            values = [FitnessFunction.fitness(start, optimizer) for start in starts]
+            self.assertEqual(values, sorted(values))
+            self.assertTrue(values[0] <
+                            FitnessFunction.fitness(optimizer.oldConfiguration, optimizer))
+
+    def test_sharedSceneTerms(self):
+        table = Object('Table', np.array([1, -1, 0.8]))
+        snapshot = self.createSnapshot([1, 3, 5], objects=[table])
+        terms = PositionProcess.SceneTerms(snapshot)
+        genome = np.array([2, -4, 0.5, np.pi / 2, 0.4])
+        for shot in snapshot.shots:
+            shared = PositionProcess.CameraOptimizer(snapshot, shot, terms=terms)
+            single = PositionProcess.CameraOptimizer(snapshot, shot)
+            self.assertTrue(shared.occluders is terms.occluders)
+            self.assertAlmostEqual(FitnessFunction.fitness(genome, shared),
+                FitnessFunction.fitness(genome, single), 9)
+
+    def test_anytimeOptimization(self):
+        snapshot = self.createSnapshot([2], self.sideCamera)
+        optimizer = PositionProcess.CameraOptimizer(snapshot, 2)
+        start = optimizer.oldConfiguration
+        o, f_o, converged = optimizer.optimizeFrom(start, time.time() - 1)
+        self.assertFalse(converged)
+        self.assertTrue((o == start).all())
+        self.assertAlmostEqual(f_o, FitnessFunction.fitness(start, optimizer))
+        o, f_o, converged = optimizer.optimizeFrom(start, time.time() + 0.05)
+        self.assertTrue(f_o <= FitnessFunction.fitness(start, optimizer))
+        self.assertAlmostEqual(f_o, FitnessFunction.fitness(o, optimizer))
+        o, f_o, converged = optimizer.optimizeFrom(start)
+        self.assertTrue(converged)
+
+    def test_optimizationCache(self):
+        cache = PositionProcess.OptimizationCache()
+        optimum = np.array([1, -3, 1.5, np.pi / 2, 0])
+
+        def lookup(location, rotation):
+            snapshot = self.createSnapshot([2], self.createCamera(location, rotation))
+            return cache.lookup(snapshot, 2, PositionProcess.SceneTerms(snapshot))[0]
+
+        snapshot = self.createSnapshot([2])
+        cache.store(snapshot, 2, PositionProcess.SceneTerms(snapshot), optimum)
+        self.assertEqual(lookup([1, -5, 1], [np.pi / 2, 0, 0]), PositionProcess.REUSE)
+        # the rotation jump penalty depends on the old camera configuration
+        self.assertEqual(lookup([1, -5, 1], [np.pi / 2, 0, 0.05]),
+            PositionProcess.WARM_START)
+        self.assertEqual(lookup([1, -5, 1], [np.pi / 2, 0, 0.5]), None)
+        # so does the side of the line
+        snapshot = self.createSnapshot([2],
+            self.createCamera([1, -0.004, 1], [np.pi / 2, 0, 0]))
+        cache.store(snapshot, 2, PositionProcess.SceneTerms(snapshot), optimum)
+        self.assertEqual(lookup([1, -0.004, 1], [np.pi / 2, 0, 0]), PositionProcess.REUSE)
+        self.assertEqual(lookup([1, 0.004, 1], [np.pi / 2, 0, 0]), None)
+
+    def test_workerErrors(self):
+        # exceptions in a worker are sent back as results
+        snapshot_queue, task_queue, result_queue = Queue(), Queue(), Queue()
+        snapshot_queue.put((1, None))
+        task_queue.put((1, 2, 0, [1, -5, 1, np.pi / 2, 0], None))
+        task_queue.put(None)
+        PositionProcess.optimizationWorker(snapshot_queue, task_queue, result_queue)
+        snapshot_id, shot, start_index, result = result_queue.get(timeout=5)
+        self.assertEqual((snapshot_id, shot, start_index), (1, 2, 0))
+        self.assertTrue(isinstance(result, PositionProcess.OptimizationError))
+        # a dead worker is an error instead of a hang
+        pool = PositionProcess.OptimizerPool(processes=1)
+        pool.workers[0].terminate()
+        pool.workers[0].join()
+        self.assertRaises(PositionProcess.OptimizationError, pool.optimizeAllShots,
+            self.createSnapshot([2]))
+
     def test_plot_rotation(self):
         c = Camera(0.48271098732948303, 1920, 1080, [5, 0, 0], [math.pi / 2, 0, math.pi])
         genome = np.array([5, 0, 0, math.pi / 2, 0, math.pi])
@@ -132,7 +343,7 @@ class TestPositionProcessFunctions(unittest.TestCase):
             np.array([0.7, -0.2, 0]), np.array([0.7, 0.2, 0]))
         lt = Person('Agnes Angeschaute', np.array([2, 0, 0]), 1,
             np.array([1.3, -0.2, 0]), np.array([1.3, 0.2, 0]))
-        persons = [t, lt]
+        persons = [self.max, self.agnes]
         #PositionProcess.optimizeAllShots(t, t, c, [t], [], genome, [2])
         snapshot = SceneSnapshot(t, lt, c, persons, [], [], [2])
         optimizer = PositionProcess.CameraOptimizer(snapshot, 2)
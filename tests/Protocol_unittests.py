@@ -0,0 +1,50 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# =============================== Imports ======================================
+import sys
+
+sys.path.append("..")
+
+import io
+import unittest
+
+from Protocol import readMessage, writeMessage, writeError, ProtocolError, RemoteError
+from Protocol import MAGIC, HEADER
+from Protocol import PROTOCOL_VERSION
+
+# ================================ Tests =======================================
+class TestProtocol(unittest.TestCase):
+    def test_skipText(self):
+        stream = io.BytesIO()
+        stream.write(b"Warning: AM\x00AMC printed by someone\n")
+        writeMessage(stream, [("advance", 19)])
+        stream.seek(0)
+        self.assertEqual(readMessage(stream), [("advance", 19)])
+
+    def test_lengthBound(self):
+        # a MAGIC with an absurd length is skipped like any other text
+        stream = io.BytesIO()
+        stream.write(HEADER.pack(MAGIC, PROTOCOL_VERSION, 2 ** 31, 0))
+        writeMessage(stream, {"new_beats": True})
+        stream.seek(0)
+        self.assertEqual(readMessage(stream), {"new_beats": True})
+
+    def test_checksum(self):
+        stream = io.BytesIO()
+        writeMessage(stream, [1, 2, 3])
+        data = bytearray(stream.getvalue())
+        data[-2] ^= 0xff
+        self.assertRaises(ProtocolError, readMessage, io.BytesIO(bytes(data)))
+
+
+    def test_error(self):
+        stream = io.BytesIO()
+        writeError(stream, "IndexError: list index out of range")
+        writeMessage(stream, [1, 2, 3])
+        stream.seek(0)
+        self.assertRaises(RemoteError, readMessage, stream)
+        self.assertEqual(readMessage(stream), [1, 2, 3])
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestProtocol)
+unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,104 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# =============================== Imports ======================================
+from __future__ import division
+import os
+import sys
+import tempfile
+from multiprocessing import Queue
+
+sys.path.append("..")
+
+import unittest
+import numpy as np
+
+from BakedScene import BakedScene, loadBakedScene, createTestBakedScene
+from Config import MEDIUM_SHOT, CLOSEUP
+from ShotPlan import PlanEntry, savePlan, loadPlan, getSegments, getEntryForFrame
+import TrajectorySolver
+
+# ================================ Tests =======================================
+class TestTrajectorySolver(unittest.TestCase):
+    def setUp(self):
+        self.plan = [PlanEntry(1, MEDIUM_SHOT, "Max", "Agnes", True),
+                     PlanEntry(10, MEDIUM_SHOT, "Agnes", "Max", False),
+                     PlanEntry(20, CLOSEUP, "Agnes", "Max", True)]
+
+    def test_plan(self):
+        handle, filename = tempfile.mkstemp(suffix=".csv")
+        os.close(handle)
+        savePlan(filename, self.plan)
+        plan = loadPlan(filename)
+        os.remove(filename)
+        self.assertEqual([(e.frame, e.shot, e.target, e.linetarget, e.cut) for e in plan],
+            [(e.frame, e.shot, e.target, e.linetarget, e.cut) for e in self.plan])
+        segments = getSegments(plan, 30)
+        self.assertEqual([(first, last, len(entries)) for first, last, entries in segments],
+            [(1, 19, 2), (20, 30, 1)])
+        self.assertEqual(getEntryForFrame(plan, 15).target, "Agnes")
+        self.assertEqual(getEntryForFrame(plan, 5).target, "Max")
+
+    def test_bakedScene(self):
+        baked = createTestBakedScene(30)
+        handle, filename = tempfile.mkstemp(suffix=".npz")
+        os.close(handle)
+        baked.save(filename)
+        loaded = loadBakedScene(filename)
+        os.remove(filename)
+        self.assertEqual(loaded.names, baked.names)
+        self.assertTrue((loaded.positions == baked.positions).all())
+        self.assertEqual(list(loaded.getFrames()), list(range(1, 31)))
+        snapshot = loaded.createSnapshot(25, "Max", "Agnes", [MEDIUM_SHOT],
+            loaded.getInitialConfiguration())
+        self.assertEqual([p.name for p in snapshot.persons], ["Max", "Agnes"])
+        self.assertEqual(snapshot.target.name, "Max")
+        self.assertAlmostEqual(snapshot.target.location[0], 0.5)
+        self.assertAlmostEqual(snapshot.target.eye_L.location[2], 1.7)
+        self.assertEqual(snapshot.linetarget.eye_R.location,
+            tuple(loaded.getLocation("Agnes_eye.R", 25)))
+        # without eyes the eyes are at the location of the person
+        kept = [i for i, name in enumerate(baked.names) if not name.startswith("Agnes_eye")]
+        eyeless = BakedScene([baked.names[i] for i in kept], baked.kinds[kept],
+            baked.heights[kept], baked.positions[:, kept], baked.first_frame, baked.camera)
+        snapshot = eyeless.createSnapshot(25, "Max", "Agnes", [MEDIUM_SHOT],
+            eyeless.getInitialConfiguration())
+        self.assertEqual(snapshot.linetarget.eye_R.location, snapshot.linetarget.location)
+
+    def test_segmentGradient(self):
+        baked = createTestBakedScene(30)
+        problem = TrajectorySolver.SegmentProblem(baked, 1, 19, self.plan[:2],
+            baked.getInitialConfiguration())
+        x = problem.getInitialPath().ravel() + 0.01
+        value, gradient = problem.objective(x)
+        h = 1e-6
+        for i in [0, 4, 7, len(x) - 1]:
+            d = np.zeros(len(x))
+            d[i] = h
+            numeric = (problem.objective(x + d)[0] - problem.objective(x - d)[0]) / (2 * h)
+            self.assertAlmostEqual(gradient[i], numeric, delta=1e-3 * max(1, abs(numeric)))
+
+    def test_solveTrajectory(self):
+        baked = createTestBakedScene(30)
+        frames, configurations = TrajectorySolver.solveTrajectory(baked, self.plan, 1)
+        self.assertEqual(list(frames), list(range(1, 31)))
+        self.assertEqual(configurations.shape, (30, 5))
+        # the camera moves smoothly between the cuts
+        self.assertTrue(np.abs(np.diff(configurations[:19, :3], axis=0)).max() < 0.5)
+        distances = TrajectorySolver.getFocusDistances(baked, self.plan, frames, configurations)
+        self.assertEqual(len(distances), 30)
+
+
+    def test_failingSegment(self):
+        # an exception in a worker is reported as the result instead of killing it
+        baked = createTestBakedScene(30)
+        task_queue, result_queue = Queue(), Queue()
+        task_queue.put((0, 1, 19, [PlanEntry(1, 99, "Max", "Agnes", True)],
+                        baked.getInitialConfiguration()))
+        task_queue.put(None)
+        TrajectorySolver.segmentWorker(baked, task_queue, result_queue)
+        self.assertRaises(TrajectorySolver.TrajectoryError, TrajectorySolver.getSegmentResult,
+            result_queue, [])
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestTrajectorySolver)
+unittest.TextTestRunner(verbosity=2).run(suite)
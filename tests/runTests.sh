@@ -3,6 +3,12 @@ echo "###################### Featurizer ######################"
 python2 Featurizer_unittests.py
 echo "\n\n\n###################### PositionProcess ######################"
 python2 PositionProcess_unittests.py
+echo "\n\n\n###################### TrajectorySolver ######################"
+python3 TrajectorySolver_unittests.py
+echo "\n\n\n###################### CameramanCore ######################"
+python3 CameramanCore_unittests.py
+echo "\n\n\n###################### Protocol ######################"
+python3 Protocol_unittests.py
 echo "\n\n\n###################### Classifier ######################"
 python3 testClassifier.py
 
@@ -4,65 +4,32 @@ import sys
 sys.path.append("..")
 
 from Config import PROJECT_PATH
-
-def readLine(filehandle):
-    #byteline = []
-    #while True:
-    #    byte = filehandle.read(1)
-    #    print(byte)
-    #    if byte == bytes('\n', 'UTF-8'):
-    #        break
-    #    byteline.append(byte)
-    #return str(byteline, encoding='utf8')
-    return filehandle.read().rstrip()
+from Protocol import ENTITIES, BLOCK, ADVANCE, SCHEDULE, DECISION, QUIT, request
 
 beatscriptFile = PROJECT_PATH + '/beatscripts/The Mighty Hugo - Testszene.csv'
 classifier_process_filename = path.join(PROJECT_PATH, "ClassificationProcess.py")
 prozess = subprocess.Popen(
     [classifier_process_filename,
-     beatscriptFile], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+     beatscriptFile], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
 while True:
-#for i in range(0,10):
     input = prozess.stdout.readline().rstrip()
     print(str(input, 'utf8'))
     if str(input, 'utf8') == "Training finished.":
         break
-#diststr = str(prozess.stdout.readline().rstrip(), encoding='utf8')
-dist = []
-#for valstr in diststr.split('\t'):
-#    dist.append(float(valstr))
-print(dist)
-prozess.stdin.write(bytes("c\n", 'utf-8'))
-prozess.stdin.flush()
-print(str(prozess.stdout.readline(), 'utf-8'))
-prozess.stdin.write(bytes("d\n", 'utf-8'))
-prozess.stdin.flush()
-prozess.stdin.write(bytes("2\n", 'utf-8'))
-prozess.stdin.flush()
-print(str(prozess.stdout.readline(), 'utf-8'))
-prozess.stdin.write(bytes("p\n", 'utf-8'))
-prozess.stdin.flush()
-print(str(prozess.stdout.readline(), 'utf-8'))
-prozess.stdin.write(bytes("t\n", 'utf-8'))
-prozess.stdin.flush()
-print(str(prozess.stdout.readline(), 'utf-8'))
-for frame in range(1, 200):
-    prozess.stdin.write(bytes("f\n", 'utf-8'))
-    prozess.stdin.flush()
-    prozess.stdin.write(bytes(str(frame) + "\n", 'utf-8'))
-    prozess.stdin.flush()
-    newBlockStr = str(prozess.stdout.readline().rstrip(), 'utf-8')
-    prozess.stdin.write(bytes("t\n", 'utf-8'))
-    prozess.stdin.flush()
-    print("Frame no. " + str(frame) + " neuer Block: " + newBlockStr + "\tTargets: " + str(prozess.stdout.readline(),
-                                                                                           'utf-8').rstrip())
-    if newBlockStr == "yes":
-        prozess.stdin.write(bytes("p\n", 'utf-8'))
-        prozess.stdin.flush()
-        print(str(prozess.stdout.readline(), 'utf-8').rstrip())
-        prozess.stdin.write(bytes("c\n", 'utf-8'))
-        prozess.stdin.flush()
-        print(str(prozess.stdout.readline(), 'utf-8').rstrip())
-prozess.stdin.write(bytes("q\n", 'utf-8'))
-prozess.stdin.flush()
-print(str(prozess.stdout.readline(), 'utf-8'))
+entities, block, schedule = request(prozess.stdout, prozess.stdin,
+    [(ENTITIES,), (BLOCK,), (SCHEDULE,)])
+print(entities)
+print("Blocks start at: " + str(schedule))
+print("Distribution: " + str(block["distribution"]) + "\tTargets: " + str(block["targets"]) +
+      "\tCut: " + str(block["cut"]))
+commands = [(DECISION, 2)]
+for frame in schedule:
+    result = request(prozess.stdout, prozess.stdin, commands + [(ADVANCE, frame)])[-1]
+    commands = []
+    print("Frame no. " + str(frame) + " neuer Block: " + str(result["new_beats"]))
+    if result["new_beats"]:
+        print("Distribution: " + str(result["distribution"]) + "\tTargets: " +
+              str(result["targets"]) + "\tCut: " + str(result["cut"]))
+        commands = [(DECISION, result["distribution"].index(max(result["distribution"])))]
+print(request(prozess.stdout, prozess.stdin, [(QUIT,)]))
+prozess.wait()